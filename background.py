@@ -0,0 +1,90 @@
+"""Rendering in a background thread.
+
+Fractals calculate their results in a generator that yields drawing
+functions. The RenderThread runs this generator in a background
+thread and queues the drawing functions, which the main thread calls
+whenever it updates the window. So the event loop never waits for
+calculations, and the window is only touched by the main thread.
+
+"""
+
+import queue
+import threading
+import time
+
+
+class RenderThread():
+    "Calculates one fractal at a time in a background thread."
+
+    def __init__(self):
+        self._thread = None
+        self._fractal = None
+        self._cancelled = threading.Event()
+        self._results = queue.Queue()
+
+    def start(self, fractal):
+        """Cancel the current calculation and start calculating FRACTAL.
+
+        Results of the cancelled calculation that haven't been drawn
+        yet are dropped.
+
+        """
+        self.cancel()
+        self._fractal = fractal
+        if fractal.stats != None:
+            fractal.stats.start()
+        self._cancelled = threading.Event()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, args=(fractal, self._cancelled, self._results),
+            daemon=True)
+        self._thread.start()
+
+    def _run(self, fractal, cancelled, results):
+        "Calculate FRACTAL until it's done or CANCELLED is set."
+        calculation = fractal.calculate()
+        try:
+            while True:
+                with fractal.timed('calculate'):
+                    draw = next(calculation, None)
+                if draw == None or cancelled.is_set():
+                    break
+                results.put(draw)
+        finally:
+            calculation.close()
+
+    def cancel(self):
+        """Stop the current calculation.
+
+        The calculation is cancelled cooperatively after the result it
+        is working on, so this waits for that result to be finished.
+
+        """
+        if self._thread != None:
+            self._cancelled.set()
+            self._thread.join()
+            self._thread = None
+
+    def running(self):
+        "Check whether the current calculation has results still to come."
+        return (self._thread != None and self._thread.is_alive()) \
+            or not self._results.empty()
+
+    def draw(self, timeout=1/60):
+        """Call the queued drawing functions for at most TIMEOUT seconds.
+
+        Must be called from the main thread. Returns whether anything
+        was drawn.
+
+        """
+        drawn = False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                draw = self._results.get_nowait()
+            except queue.Empty:
+                break
+            with self._fractal.timed('draw'):
+                draw()
+            drawn = True
+        return drawn
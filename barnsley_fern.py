@@ -0,0 +1,25 @@
+import ifs
+import view
+
+
+class BarnsleyFern(ifs.IteratedFunctionSystem):
+    "Represents the barnsley fern."
+
+    # stem, smaller leaflets, largest left and right leaflets
+    maps = [[[0, 0, 0], [0, 0.16, 0]],
+            [[0.85, 0.04, 0], [-0.04, 0.85, 1.6]],
+            [[0.2, -0.26, 0], [0.23, 0.22, 1.6]],
+            [[-0.15, 0.28, 0], [0.26, 0.24, 0.44]]]
+    probabilities = [0.01, 0.85, 0.07, 0.07]
+
+    def __init__(self, canvas, depth=10_000_000, allowed_keyevents=[],
+                 color=False):
+        super().__init__(view.View(canvas, x=(-3,3), y=(-0.25,10.25)),
+                         depth, allowed_keyevents, color)
+
+    def set_title(self, rendering=False):
+        "Sets the window title, indicating if rendering is in process."
+        if rendering:
+            self.view.canvas.set_title("Barnsley Fern (rendering)")
+        else:
+            self.view.canvas.set_title("Barnsley Fern")
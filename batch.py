@@ -0,0 +1,222 @@
+"""Batch rendering of large images without a display.
+
+The image is split into tiles, which are rendered one by one on a
+pool of worker processes and written into a raw RGB file next to the
+output file. The raw file is memory-mapped, so only the tiles that
+are being rendered are held in memory, however large the image is.
+The finished tiles are recorded in a state file, so an interrupted
+run continues where it stopped when it is started again with the
+same arguments. When all tiles are finished, the raw file is
+streamed into a PNG file row by row.
+
+Example:
+
+    python batch.py mandelbrot poster.png --size 20000 15000 \\
+        --x -0.75 -0.73 --depth 2000
+
+"""
+
+import argparse
+import canvas
+import concurrent.futures
+import fractions
+import functools
+import json
+import julia
+import mandelbox
+import mandelbrot
+import numpy as np
+import os
+import png
+import tiles
+
+
+FRACTALS = ('mandelbrot', 'julia', 'mandelbox')
+TILE_SIZE = 1024
+# rows that are compressed into the PNG file at once
+BAND_HEIGHT = 256
+
+@functools.lru_cache(maxsize=1)
+def make_fractal(name, depth, color, smooth, subdivide, distance, constant):
+    """Return the fractal NAME with the given parameters.
+
+    Every worker process keeps the fractal of the current run, so
+    that the buffers of its tiles are reused.
+
+    """
+    headless = canvas.HeadlessCanvas(1, 1)
+    if name == 'mandelbrot':
+        return mandelbrot.Mandelbrot(headless, depth=depth, color=color,
+                                     smooth=smooth, subdivide=subdivide,
+                                     distance=distance)
+    if name == 'julia':
+        return julia.Julia(None, headless, depth=depth, constant=constant,
+                           color=color, smooth=smooth, subdivide=subdivide,
+                           distance=distance)
+    return mandelbox.Mandelbox(headless, depth=depth, color=color)
+
+def default_bounds(fractal_arguments, x, y, size):
+    """Complete the bounds X and Y of an image of SIZE.
+
+    Missing bounds are taken from the default view of the fractal,
+    see make_fractal for FRACTAL_ARGUMENTS, so that the pixels are
+    square.
+
+    """
+    view = make_fractal(*fractal_arguments).view
+    if x == None and y == None:
+        y = tuple(fractions.Fraction(v) for v in view.y)
+    if x == None:
+        middle = fractions.Fraction(view.middle_x())
+        width = (y[1] - y[0]) * size[0] / size[1]
+        x = (middle - width / 2, middle + width / 2)
+    elif y == None:
+        middle = fractions.Fraction(view.middle_y())
+        height = (x[1] - x[0]) * size[1] / size[0]
+        y = (middle - height / 2, middle + height / 2)
+    return x, y
+
+def tile_bounds(x, y, size, tile):
+    "Return the bounds of TILE of an image of SIZE with the bounds X and Y."
+    def scale(bounds, start, end, length):
+        return (bounds[0] + (bounds[1] - bounds[0]) * start / length,
+                bounds[0] + (bounds[1] - bounds[0]) * end / length)
+    top, bottom = scale((y[1], y[0]), tile.y, tile.y + tile.height, size[1])
+    return (scale(x, tile.x, tile.x + tile.width, size[0]), (bottom, top))
+
+def render_tile(fractal_arguments, x, y, size, tile, filename):
+    """Render TILE of an image of SIZE into the raw file FILENAME.
+
+    This function runs in a worker process. X and Y are the bounds
+    of the image, FRACTAL_ARGUMENTS are passed to make_fractal.
+    Returns the tile.
+
+    """
+    fractal = make_fractal(*fractal_arguments)
+    fractal.view.canvas = canvas.HeadlessCanvas(tile.width, tile.height)
+    fractal.view.set_bounds(*tile_bounds(x, y, size, tile))
+    fractal.paused = False
+    fractal.render()
+    image = np.memmap(filename, dtype=np.uint8, mode='r+',
+                      shape=(size[1], size[0], 3))
+    image[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width] = \
+        fractal.view.canvas.pixels.transpose(1, 0, 2)
+    image.flush()
+    del image
+    return tile
+
+def load_state(filename, parameters):
+    """Return the finished tiles of the run with PARAMETERS.
+
+    An empty list is returned if there is no state file FILENAME.
+    Raises a ValueError if it belongs to a run with other parameters.
+
+    """
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        state = json.load(f)
+    if state['parameters'] != parameters:
+        raise ValueError("{} belongs to a run with other arguments, "
+                         "remove it to start over".format(filename))
+    return [tiles.Tile(*tile) for tile in state['finished']]
+
+def save_state(filename, parameters, finished):
+    "Record the FINISHED tiles of the run with PARAMETERS in FILENAME."
+    # write a new file first, so an interruption can't leave half a file
+    with open(filename + '.new', 'w') as f:
+        json.dump({'parameters': parameters, 'finished': finished}, f)
+    os.replace(filename + '.new', filename)
+
+def write_png(filename, raw_filename, size):
+    "Stream the raw image of SIZE in RAW_FILENAME into the PNG FILENAME."
+    image = np.memmap(raw_filename, dtype=np.uint8, mode='r',
+                      shape=(size[1], size[0], 3))
+    writer = png.Writer(filename, *size)
+    for row in range(0, size[1], BAND_HEIGHT):
+        writer.write_rows(image[row:row + BAND_HEIGHT])
+    writer.close()
+    del image
+
+def render(fractal_arguments, x, y, size, filename, tile_size=TILE_SIZE,
+           workers=None):
+    """Render an image of SIZE with the bounds X and Y into the PNG FILENAME.
+
+    X and Y are pairs of fractions, FRACTAL_ARGUMENTS are passed to
+    make_fractal. The tiles are rendered on WORKERS processes. If a
+    previous run with the same arguments was interrupted, its
+    finished tiles are kept.
+
+    """
+    raw_filename = filename + '.rgb'
+    state_filename = filename + '.json'
+    # the parameters as they are read back from the state file
+    parameters = json.loads(json.dumps({
+        'fractal': fractal_arguments, 'x': [str(v) for v in x],
+        'y': [str(v) for v in y], 'size': size, 'tile_size': tile_size}))
+    finished = load_state(state_filename, parameters)
+    if not finished:
+        # allocate the raw file without writing it
+        with open(raw_filename, 'wb') as f:
+            f.truncate(size[0] * size[1] * 3)
+    done = set(finished)
+    remaining = [tile for tile in tiles.split(*size, tile_size)
+                 if tile not in done]
+    total = len(finished) + len(remaining)
+
+    pool = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        futures = [pool.submit(render_tile, fractal_arguments, x, y, size,
+                               tile, raw_filename)
+                   for tile in remaining]
+        for future in concurrent.futures.as_completed(futures):
+            finished.append(future.result())
+            save_state(state_filename, parameters, finished)
+            print("{}/{} tiles".format(len(finished), total))
+    finally:
+        # on interruption, don't wait for the tiles being rendered
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    write_png(filename, raw_filename, size)
+    os.remove(raw_filename)
+    os.remove(state_filename)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render a fractal into a PNG file of any size.")
+    parser.add_argument('fractal', choices=FRACTALS)
+    parser.add_argument('output', help="PNG file to write")
+    parser.add_argument('--size', type=int, nargs=2, default=(1920, 1080),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--x', type=fractions.Fraction, nargs=2,
+                        metavar=('MIN', 'MAX'),
+                        help="real bounds, derived from the imaginary ones "
+                        "if missing")
+    parser.add_argument('--y', type=fractions.Fraction, nargs=2,
+                        metavar=('MIN', 'MAX'),
+                        help="imaginary bounds, derived from the real ones "
+                        "if missing")
+    parser.add_argument('--depth', type=int, default=100)
+    parser.add_argument('--constant', type=float, nargs=2,
+                        default=(0.7, 0.3), metavar=('REAL', 'IMAG'),
+                        help="constant of the julia set")
+    parser.add_argument('--gray', action='store_true')
+    parser.add_argument('--smooth', action='store_true')
+    parser.add_argument('--subdivide', action='store_true')
+    parser.add_argument('--distance', action='store_true')
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    fractal_arguments = (args.fractal, max(2, args.depth), not args.gray,
+                         args.smooth, args.subdivide, args.distance,
+                         tuple(args.constant))
+    x, y = default_bounds(fractal_arguments, args.x, args.y, args.size)
+    try:
+        render(fractal_arguments, x, y, tuple(args.size), args.output,
+               args.tile_size, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == '__main__':
+    main()
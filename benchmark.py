@@ -0,0 +1,242 @@
+"""Benchmarks of the kernels and of whole renders.
+
+Every benchmark calculates a fixed view at a fixed depth without a
+display. The kernel benchmarks call the vectorized kernels of engine
+or a calc_point function on the pixels of the view, the render
+benchmarks render the whole fractal on a canvas.HeadlessCanvas,
+including the progressive levels and the drawing. The fastest of
+several runs is reported in wall time, pixels per second and, for
+the kernels, iterations per second. Iterations are counted as if
+every point was iterated until it escaped or reached the depth, so
+skipping iterations shows up as a higher rate.
+
+The results can be written as JSON and compared with the JSON of an
+earlier run, which makes the command fail if a benchmark got slower.
+
+Example:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+
+"""
+
+import argparse
+import barnsley_fern
+import canvas
+import engine
+import json
+import julia
+import logistic_map
+import mandelbox
+import mandelbrot
+import numpy as np
+import platform
+import sierpinski
+import sys
+import time
+import view
+
+
+SIZE = (640, 480)
+# fastest of this many runs
+REPEAT = 5
+# relative slowdown that counts as a regression
+TOLERANCE = 0.15
+
+MANDELBROT_VIEW = ((-2.1, 0.9), (-1.125, 1.125))
+JULIA_VIEW = ((-1.6, 1.6), (-1.2, 1.2))
+JULIA_CONSTANT = (-0.8, 0.156)
+MANDELBOX_VIEW = ((-2.4, 2.4), (-1.8, 1.8))
+
+def escape_iterations(counts, depth):
+    "Return the iterations of points that escaped after COUNTS or reached DEPTH."
+    return int(np.minimum(np.asarray(counts, dtype=np.int64) + 1, depth).sum())
+
+def kernel_mandelbrot():
+    depth = 1000
+    points = view.pixel_points(*MANDELBROT_VIEW, SIZE)
+    def run():
+        return points.size, escape_iterations(
+            engine.mandelbrot(points, depth), depth)
+    return run
+
+def kernel_julia():
+    depth = 1000
+    points = view.pixel_points(*JULIA_VIEW, SIZE)
+    def run():
+        return points.size, escape_iterations(
+            engine.julia(points, JULIA_CONSTANT, depth), depth)
+    return run
+
+def kernel_mandelbox():
+    depth = 100
+    points = view.pixel_points(*MANDELBOX_VIEW, SIZE)
+    def run():
+        return points.size, escape_iterations(
+            engine.mandelbox(points, 1.5, depth), depth)
+    return run
+
+def kernel_logistic_map():
+    depth, transient = 1000, 100
+    rates = np.linspace(3.5, 4, SIZE[0], endpoint=False)
+    def run():
+        engine.logistic_map(rates, depth, (0, 1), SIZE[1], transient,
+                            1e-3 / SIZE[1])
+        return SIZE[0] * SIZE[1], rates.size * (transient + depth)
+    return run
+
+def kernel_sierpinski():
+    walkers, steps = 2**16, 30
+    rng = np.random.default_rng(0)
+    points = rng.random(walkers) + 1j * rng.random(walkers)
+    def run():
+        hits = np.zeros(SIZE)
+        engine.chaos_game(sierpinski.Sierpinski.maps,
+                          sierpinski.Sierpinski.probabilities, points, steps,
+                          (0, 1), (0, 1), hits, rng=rng)
+        return SIZE[0] * SIZE[1], walkers * steps
+    return run
+
+def calc_point_mandelbrot():
+    # calc_point works point by point, so it gets a smaller view
+    size = (SIZE[0] // 10, SIZE[1] // 10)
+    fractal = mandelbrot.Mandelbrot(canvas.HeadlessCanvas(*size), depth=1000)
+    points = view.pixel_points(*MANDELBROT_VIEW, size).ravel()
+    def run():
+        counts = [fractal.calc_point((p.real, p.imag)) for p in points]
+        return points.size, escape_iterations(counts, 1000)
+    return run
+
+def render(make_fractal):
+    """Return a benchmark of rendering the fractal returned by MAKE_FRACTAL.
+
+    MAKE_FRACTAL is called with a canvas.HeadlessCanvas of SIZE.
+
+    """
+    def benchmark():
+        fractal = make_fractal(canvas.HeadlessCanvas(*SIZE))
+        def run():
+            fractal.render()
+            return SIZE[0] * SIZE[1], None
+        return run
+    return benchmark
+
+def mandelbrot_fractal(headless):
+    fractal = mandelbrot.Mandelbrot(headless, depth=1000)
+    fractal.view.x, fractal.view.y = MANDELBROT_VIEW
+    return fractal
+
+def julia_fractal(headless):
+    fractal = julia.Julia(None, headless, depth=1000,
+                          constant=JULIA_CONSTANT)
+    fractal.view.x, fractal.view.y = JULIA_VIEW
+    return fractal
+
+def mandelbox_fractal(headless):
+    fractal = mandelbox.Mandelbox(headless, depth=100)
+    fractal.view.x, fractal.view.y = MANDELBOX_VIEW
+    return fractal
+
+BENCHMARKS = {
+    'kernel_mandelbrot': kernel_mandelbrot,
+    'kernel_julia': kernel_julia,
+    'kernel_mandelbox': kernel_mandelbox,
+    'kernel_logistic_map': kernel_logistic_map,
+    'kernel_sierpinski': kernel_sierpinski,
+    'calc_point_mandelbrot': calc_point_mandelbrot,
+    'render_mandelbrot': render(mandelbrot_fractal),
+    'render_julia': render(julia_fractal),
+    'render_mandelbox': render(mandelbox_fractal),
+    'render_logistic_map': render(
+        lambda headless: logistic_map.LogisticMap(headless, depth=1000)),
+    'render_sierpinski': render(
+        lambda headless: sierpinski.Sierpinski(headless, depth=4_000_000)),
+    'render_barnsley_fern': render(
+        lambda headless: barnsley_fern.BarnsleyFern(headless,
+                                                    depth=4_000_000)),
+}
+
+def measure(benchmark, repeat=REPEAT):
+    """Run BENCHMARK REPEAT times and return the results of the fastest run.
+
+    BENCHMARK is called to prepare a run and returns a function that
+    does the measured work and returns the number of pixels and of
+    iterations, which may be None.
+
+    """
+    best = None
+    for i in range(repeat):
+        run = benchmark()
+        start = time.perf_counter()
+        pixels, iterations = run()
+        seconds = time.perf_counter() - start
+        if best == None or seconds < best['seconds']:
+            best = {'seconds': seconds,
+                    'pixels_per_second': pixels / seconds,
+                    'iterations_per_second': None if iterations == None
+                    else iterations / seconds}
+    return best
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print RESULTS next to BASELINE and return the names that got slower.
+
+    Benchmarks that take more than 1 + TOLERANCE times as long as in
+    the baseline count as slower.
+
+    """
+    slower = []
+    print("{:24} {:>10} {:>10} {:>8}".format(
+        "benchmark", "baseline", "seconds", "change"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['seconds'], result['seconds']
+        mark = ""
+        if after > before * (1 + tolerance):
+            slower.append(name)
+            mark = " slower"
+        print("{:24} {:10.4f} {:10.4f} {:+7.1%}{}".format(
+            name, before, after, after / before - 1, mark))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the kernels and renders of the fractals.")
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help="benchmarks to run, all by default: {}"
+                        .format(", ".join(BENCHMARKS)))
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline',
+                        help="JSON file of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark {}".format(name))
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = measure(BENCHMARKS[name], args.repeat)
+        iterations = results[name]['iterations_per_second']
+        print("{:24} {:8.4f} s {:12.0f} pixels/s {:>14} iterations/s".format(
+            name, results[name]['seconds'],
+            results[name]['pixels_per_second'],
+            "-" if iterations == None else "{:.0f}".format(iterations)))
+
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'numpy': np.__version__, 'size': SIZE,
+                       'benchmarks': results}, f, indent=2)
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['size'] != list(SIZE):
+            parser.error("the baseline was measured at another size")
+        if compare(results, baseline['benchmarks'], args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Least recently used cache of calculated pixels.
+
+Pixels are stored in tiles of the lattice of all pixels (see
+View.snap), so they are found again after the view has moved away and
+back, zoomed out and in again or after switching between fractals.
+
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+
+class TileCache():
+    """Caches colortable indices of lattice tiles up to BUDGET bytes.
+
+    Tiles are keyed by the kernel and its arguments, like depth,
+    threshold, constant or scale, by the pixel size of the view and by
+    the position of the tile on the lattice. When the cache grows
+    beyond its budget, the least recently used tiles are evicted.
+
+    """
+
+    def __init__(self, budget=256 * 2**20, tile_size=64):
+        self.budget = budget
+        self.tile_size = tile_size
+        self.size = 0
+        self._tiles = OrderedDict()
+
+    def tiles(self, kernel, arguments, view):
+        """Yield the key of every lattice tile in VIEW and where it lies.
+
+        Where it lies is given as slices into the arrays of the canvas
+        and slices into the arrays of the tile.
+
+        """
+        parameters = (kernel.__module__, kernel.__name__,
+                      tuple(sorted(arguments.items())))
+        pixel_size = view.pixel_size()
+        column, row = view.origin()
+        width, height = view.canvas.width, view.canvas.height
+        size = self.tile_size
+        for i in range(column // size, -(-(column + width) // size)):
+            left = max(column, i * size)
+            right = min(column + width, (i + 1) * size)
+            for j in range(row // size, -(-(row + height) // size)):
+                top = max(row, j * size)
+                bottom = min(row + height, (j + 1) * size)
+                yield ((parameters, pixel_size, i, j),
+                       (slice(left - column, right - column),
+                        slice(top - row, bottom - row)),
+                       (slice(left - i * size, right - i * size),
+                        slice(top - j * size, bottom - j * size)))
+
+    def load(self, kernel, arguments, view, counts, known):
+        "Copy all cached pixels of VIEW into COUNTS and mark them in KNOWN."
+        for key, canvas_slices, tile_slices in self.tiles(kernel, arguments,
+                                                          view):
+            if key not in self._tiles:
+                continue
+            self._tiles.move_to_end(key)
+            tile_counts, tile_known = self._tiles[key]
+            cached = tile_known[tile_slices]
+            counts[canvas_slices][cached] = tile_counts[tile_slices][cached]
+            known[canvas_slices] |= cached
+
+    def store(self, kernel, arguments, view, counts, known):
+        "Store all pixels of VIEW in COUNTS that are marked in KNOWN."
+        for key, canvas_slices, tile_slices in self.tiles(kernel, arguments,
+                                                          view):
+            new = known[canvas_slices]
+            if not new.any():
+                continue
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                tile_counts, tile_known = self._tiles[key]
+            else:
+                tile_counts = np.zeros((self.tile_size, self.tile_size),
+                                       dtype=counts.dtype)
+                tile_known = np.zeros((self.tile_size, self.tile_size),
+                                      dtype=bool)
+                self._tiles[key] = (tile_counts, tile_known)
+                self.size += tile_counts.nbytes + tile_known.nbytes
+            tile_counts[tile_slices][new] = counts[canvas_slices][new]
+            tile_known[tile_slices] |= new
+        self.evict()
+
+    def evict(self):
+        "Remove the least recently used tiles until the budget is kept."
+        while self.size > self.budget and self._tiles:
+            tile_counts, tile_known = self._tiles.popitem(last=False)[1]
+            self.size -= tile_counts.nbytes + tile_known.nbytes
@@ -1,3 +1,5 @@
+import numpy as np
+import png
 import pygame
 
 
@@ -13,6 +15,8 @@ class Canvas():
 
     """
 
+    interactive = True
+
     def __init__(self, width, height):
         # init pygame
         pygame.init()
@@ -20,11 +24,16 @@ class Canvas():
         # init drawing surface
         self.width = width
         self.height = height
-        self._sf = pygame.Surface((width, height))
+        self.title = ""
+        # 32 bit, so that surfarray can access the pixels directly
+        self._sf = pygame.Surface((width, height), depth=32)
+        # the last palette of blit_indices and its pixel values
+        self._palette = (None, None)
         self.fill()
 
     def set_title(self, title):
         "Set the window title."
+        self.title = title
         pygame.display.set_caption(title)
 
     def update(self):
@@ -32,9 +41,17 @@ class Canvas():
         self._game_display.blit(self._sf, (0,0))
         pygame.display.update()
 
+    def get_events(self):
+        "Return the pending events of the window."
+        return pygame.event.get()
+
+    def save(self, filename):
+        "Save the canvas as an image file."
+        pygame.image.save(self._sf, filename)
+
     def pixel(self, pos, color=BLACK):
         "Color one pixel."
-        self._sf.set_at(pos, color)
+        self._sf.set_at((int(pos[0]), int(pos[1])), color)
 
     def rectangle(self, pos_from, pos_to, color=BLACK):
         "Color a rectangle starting at POS_FROM and ending at POS_TO."
@@ -42,6 +59,54 @@ class Canvas():
                                       abs(pos_to[1] - pos_from[1])))
         self._sf.fill(color, rect)
 
+    def blit(self, pos, colors):
+        """Copy an array of RGB COLORS, indexed by [column, row], to POS.
+
+        The colors are written into the pixels of the surface in one
+        bulk operation, without creating an intermediate surface.
+
+        """
+        pixels = pygame.surfarray.pixels3d(self._sf)
+        pixels[pos[0]:pos[0] + colors.shape[0],
+               pos[1]:pos[1] + colors.shape[1]] = colors
+        # the surface stays locked as long as the array exists
+        del pixels
+
+    def blit_indices(self, pos, indices, palette):
+        """Draw an array of INDICES into PALETTE, indexed by [column, row], at POS.
+
+        PALETTE is an array of RGB colors. It is converted to the
+        pixel format of the surface, so the whole area is written with
+        a single lookup. The conversion is kept for as long as the same
+        palette array is passed.
+
+        """
+        if palette is not self._palette[0]:
+            self._palette = (palette, self.map_colors(palette))
+        mapped = self._palette[1]
+        pixels = pygame.surfarray.pixels2d(self._sf)
+        pixels[pos[0]:pos[0] + indices.shape[0],
+               pos[1]:pos[1] + indices.shape[1]] = mapped[indices]
+        # the surface stays locked as long as the array exists
+        del pixels
+
+    def map_colors(self, colors):
+        "Convert an array of RGB COLORS to pixel values of the surface."
+        colors = np.asarray(colors, dtype=np.uint32)
+        shifts = self._sf.get_shifts()
+        losses = self._sf.get_losses()
+        masks = self._sf.get_masks()
+        # opaque, if the surface has an alpha channel
+        mapped = np.full(colors.shape[:-1], masks[3], dtype=np.uint32)
+        for channel in range(3):
+            mapped |= (colors[..., channel] >> losses[channel]
+                       << shifts[channel]) & masks[channel]
+        return mapped
+
+    def scroll(self, dx, dy):
+        "Move the contents of the canvas by DX columns and DY rows."
+        self._sf.scroll(dx, dy)
+
     def fill(self, color=WHITE):
         "Fill the entire canvas with one color."
         self._sf.fill(color)
@@ -51,3 +116,79 @@ class Canvas():
         pos_from = (pos[0] - size / 2, pos[1] - size / 2)
         pos_to = (pos[0] + size / 2, pos[1] + size / 2)
         self.rectangle(pos_from, pos_to, color=color)
+
+class HeadlessCanvas():
+    """Represents an in-memory image with a certain WIDTH and HEIGHT.
+
+    Offers the same primitives as Canvas without opening a window,
+    so that fractals can be rendered on machines without a display.
+    The pixels are stored in the pixels member, an array of RGB
+    colors indexed by [column, row].
+
+    """
+
+    interactive = False
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.title = ""
+        self.pixels = np.zeros((width, height, 3), dtype=np.uint8)
+        self.fill()
+
+    def set_title(self, title):
+        "Set the title. It is only stored."
+        self.title = title
+
+    def update(self):
+        "Do nothing, there's no display to update."
+        pass
+
+    def get_events(self):
+        "Return no events, there's no window to receive them."
+        return []
+
+    def save(self, filename):
+        "Save the canvas as a PNG file."
+        png.write(filename, self.pixels.transpose(1, 0, 2))
+
+    def pixel(self, pos, color=BLACK):
+        "Color one pixel."
+        x, y = int(pos[0]), int(pos[1])
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[x, y] = color
+
+    def rectangle(self, pos_from, pos_to, color=BLACK):
+        "Color a rectangle starting at POS_FROM and ending at POS_TO."
+        x, y = int(pos_from[0]), int(pos_from[1])
+        width = int(abs(pos_to[0] - pos_from[0]))
+        height = int(abs(pos_to[1] - pos_from[1]))
+        self.pixels[max(0, x):max(0, x + width),
+                    max(0, y):max(0, y + height)] = color
+
+    def blit(self, pos, colors):
+        "Copy an array of RGB COLORS, indexed by [column, row], to POS."
+        self.pixels[pos[0]:pos[0] + colors.shape[0],
+                    pos[1]:pos[1] + colors.shape[1]] = colors
+
+    def blit_indices(self, pos, indices, palette):
+        "Draw an array of INDICES into PALETTE, indexed by [column, row], at POS."
+        self.pixels[pos[0]:pos[0] + indices.shape[0],
+                    pos[1]:pos[1] + indices.shape[1]] = palette[indices]
+
+    def scroll(self, dx, dy):
+        "Move the contents of the canvas by DX columns and DY rows."
+        source = self.pixels[max(0, -dx):self.width - max(0, dx),
+                             max(0, -dy):self.height - max(0, dy)].copy()
+        self.pixels[max(0, dx):self.width - max(0, -dx),
+                    max(0, dy):self.height - max(0, -dy)] = source
+
+    def fill(self, color=WHITE):
+        "Fill the entire canvas with one color."
+        self.pixels[:,:] = color
+
+    def square(self, pos, size, color=BLACK):
+        "Color a square at POS with a size of SIZE x SIZE pixel."
+        pos_from = (pos[0] - size / 2, pos[1] - size / 2)
+        pos_to = (pos[0] + size / 2, pos[1] + size / 2)
+        self.rectangle(pos_from, pos_to, color=color)
@@ -0,0 +1,451 @@
+"""Vectorized escape-time kernels.
+
+Every kernel takes an array of complex coordinates and returns an
+array of colortable indices with the same shape. Points that escape
+are dropped from the working set, so each iteration only costs as
+much as the number of points that are still iterating. Kernels can
+keep the state of the iteration of their points, so that it can be
+continued when the depth is raised.
+
+The bifurcation diagram of the logistic map and the chaos game of
+iterated function systems have kernels of their own, which count how
+often the orbits pass the pixels instead.
+
+"""
+
+import numpy as np
+
+
+# iterations of points that are known to never escape
+NEVER = np.iinfo(np.int32).max
+# longest cycle of the logistic map that is detected
+MAX_PERIOD = 64
+
+def iterate(z, c, depth, step, escaped, tolerance=None, start=0):
+    """Iterate STEP on Z with the constants C up to the DEPTH-th time.
+
+    STEP is called with the current values and constants of all
+    lanes that haven't escaped yet and returns their new values.
+    ESCAPED is called with these new values and returns a boolean
+    mask of lanes that escaped in this iteration. Returns the
+    colortable indices, which have the same meaning as the ones
+    returned by the per-point calc_point functions, the values of
+    all lanes when they escaped or when DEPTH was reached, and the
+    iterations of all lanes. These are the colortable index of lanes
+    that escaped, NEVER for lanes that are cycling and DEPTH for the
+    others. Z are the values after START iterations.
+
+    If TOLERANCE is given, the orbits are checked for periodicity:
+    every lane remembers its value at iterations that are powers of
+    two, and lanes that come back to that value within TOLERANCE are
+    cycling and will never escape, so they stop early.
+
+    """
+    shape = np.shape(z)
+    z = np.array(z, dtype=complex).ravel()
+    c = np.array(np.broadcast_to(c, shape), dtype=complex).ravel()
+    indices = np.full(z.size, depth - 1, dtype=np.int32)
+    values = np.zeros(z.size, dtype=complex)
+    iterations = np.full(z.size, depth, dtype=np.int32)
+    lanes = np.arange(z.size)
+    saved = z.copy()
+    save_at = start + 1
+    for colortable_index in range(start, depth):
+        if lanes.size == 0:
+            break
+        z = step(z, c)
+        done = escaped(z)
+        if done.any():
+            indices[lanes[done]] = colortable_index
+            values[lanes[done]] = z[done]
+            iterations[lanes[done]] = colortable_index
+        if tolerance != None:
+            cycling = ~done & (abs(z - saved) < tolerance)
+            values[lanes[cycling]] = z[cycling]
+            iterations[lanes[cycling]] = NEVER
+            done |= cycling
+            if colortable_index + 1 == save_at:
+                saved = z.copy()
+                save_at *= 2
+        if done.any():
+            keep = ~done
+            lanes, z, c, saved = lanes[keep], z[keep], c[keep], saved[keep]
+    values[lanes] = z
+    return (indices.reshape(shape), values.reshape(shape),
+            iterations.reshape(shape))
+
+def new_state(shape):
+    "Return the state of points of SHAPE that haven't been iterated yet."
+    return (np.zeros(shape, dtype=complex), np.zeros(shape, dtype=np.int32),
+            np.zeros(shape, dtype=bool))
+
+def resume(z, c, depth, step, escaped, tolerance=None, state=None):
+    """Iterate like iterate, continuing where STATE stopped.
+
+    STATE is a tuple of the arrays values, iterations and escaped,
+    shaped like Z, and is updated in place. Lanes that escaped hold
+    their colortable index and their value when they escaped. Lanes
+    that didn't escape hold the number of iterations done and their
+    current value, or NEVER if they are known to never escape. Lanes
+    without iterations start at Z. Returns the colortable indices
+    and values like iterate.
+
+    """
+    shape = np.shape(z)
+    z = np.broadcast_to(np.asarray(z, dtype=complex), shape)
+    c = np.broadcast_to(np.asarray(c, dtype=complex), shape)
+    if state == None:
+        state = new_state(shape)
+    previous, iterations, escaped_before = state
+    indices = np.full(shape, depth - 1, dtype=np.int32)
+    values = np.zeros(shape, dtype=complex)
+    # lanes that escaped within DEPTH already
+    finished = escaped_before & (iterations < depth)
+    indices[finished] = iterations[finished]
+    values[finished] = previous[finished]
+    # lanes that still have iterations to go, grouped by where they stopped
+    todo = ~escaped_before & (iterations < depth)
+    for start in np.unique(iterations[todo]):
+        lanes = todo & (iterations == start)
+        initial = z[lanes] if start == 0 else previous[lanes]
+        indices[lanes], values[lanes], done = iterate(
+            initial, c[lanes], depth, step, escaped, tolerance, start)
+        previous[lanes] = values[lanes]
+        iterations[lanes] = done
+        escaped_before[lanes] = done < depth
+    return indices, values
+
+def quadratic_step(z, c):
+    "One iteration of z -> z^2 + c."
+    return z * z + c
+
+def magnitude_escape(threshold):
+    "Return an escape test that compares the magnitude to THRESHOLD."
+    bailout = threshold**2
+    def escaped(z):
+        return z.real**2 + z.imag**2 > bailout
+    return escaped
+
+def threshold_escape(threshold):
+    """Return an escape test that compares both coordinates to THRESHOLD.
+
+    Unlike the magnitude, this isn't a true bailout: orbits that went
+    past it can come back. The mandelbox is drawn by this test anyway,
+    because its folds pull every orbit of the view back within any
+    radius that is safe to bail out at.
+
+    """
+    def escaped(z):
+        return (z.real > threshold) | (z.imag > threshold)
+    return escaped
+
+def smoothen(indices, values, depth, threshold):
+    """Turn colortable INDICES into normalized smooth iteration counts.
+
+    VALUES are the values of the points when they escaped the
+    quadratic iteration. The fractional part is derived from how far
+    they went beyond THRESHOLD, so the counts change continuously
+    between neighbouring points. Larger thresholds give smoother
+    results.
+
+    """
+    counts = indices.astype(float)
+    magnitudes = abs(values)
+    escaped = magnitudes > threshold
+    counts[escaped] += 1 - np.log2(np.log(magnitudes[escaped])
+                                   / np.log(threshold))
+    return np.clip(counts, 0, depth - 1)
+
+def in_cardioid_or_bulb(points):
+    """Check whether POINTS lie in the main cardioid or the period-2 bulb.
+
+    These points are within the mandelbrot set, so they don't need
+    to be iterated. Works on single complex numbers as well.
+
+    """
+    x, y = points.real, points.imag
+    q = (x - 0.25)**2 + y**2
+    cardioid = q * (q + (x - 0.25)) <= 0.25 * y**2
+    bulb = (x + 1)**2 + y**2 <= 0.0625
+    return cardioid | bulb
+
+def mandelbrot(points, depth, threshold=2, smooth=False, tolerance=1e-12,
+               state=None):
+    """Calculate the colortable indices of POINTS in the mandelbrot set.
+
+    Points in the main cardioid and the period-2 bulb aren't
+    iterated at all and orbits that are found to be periodic within
+    TOLERANCE stop early. If SMOOTH is true, return smooth iteration
+    counts instead. If STATE is given, the iteration continues from
+    it, see resume.
+
+    """
+    points = np.asarray(points, dtype=complex)
+    if state == None:
+        state = new_state(points.shape)
+    interior = in_cardioid_or_bulb(points)
+    state[1][interior] = NEVER
+    state[2][interior] = False
+    indices, values = resume(points, points, depth, quadratic_step,
+                             magnitude_escape(threshold), tolerance, state)
+    if smooth:
+        return smoothen(indices, values, depth, threshold)
+    return indices
+
+def julia(points, constant, depth, threshold=2, smooth=False, state=None):
+    """Calculate the colortable indices of POINTS in the julia set of CONSTANT.
+
+    If SMOOTH is true, return smooth iteration counts instead. If
+    STATE is given, the iteration continues from it, see resume.
+
+    """
+    indices, values = resume(points, complex(*constant), depth,
+                             quadratic_step, magnitude_escape(threshold),
+                             state=state)
+    if smooth:
+        return smoothen(indices, values, depth, threshold)
+    return indices
+
+def distances(z, c, depth, offset, radius=1000):
+    """Estimate the distances of the points at Z to the set.
+
+    Z is iterated like the quadratic step with the constants C,
+    together with its derivative, which gets OFFSET added in every
+    step. Points are iterated at most DEPTH times or until they
+    escape RADIUS, which is large to make the estimates accurate.
+    Returns a lower bound of the distance of every point, or 0 if it
+    didn't escape.
+
+    """
+    shape = np.shape(z)
+    z = np.array(z, dtype=complex).ravel()
+    c = np.array(np.broadcast_to(c, shape), dtype=complex).ravel()
+    derivative = np.ones(z.size, dtype=complex)
+    result = np.zeros(z.size)
+    lanes = np.arange(z.size)
+    bailout = radius**2
+    # derivatives of points close to the set overflow and those of the
+    # preimages of 0 vanish, both get an estimate of 0
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for colortable_index in range(depth):
+            if lanes.size == 0:
+                break
+            derivative = 2 * z * derivative + offset
+            z = z * z + c
+            done = z.real**2 + z.imag**2 > bailout
+            if done.any():
+                magnitude = abs(z[done])
+                # a quarter of the estimate, which is a lower bound
+                result[lanes[done]] = (magnitude * np.log(magnitude)
+                                       / abs(derivative[done]) / 2)
+                keep = ~done
+                lanes, z, c, derivative = \
+                    lanes[keep], z[keep], c[keep], derivative[keep]
+    return np.nan_to_num(result, posinf=0).reshape(shape)
+
+def mandelbrot_distance(points, depth, state=None):
+    """Estimate the distances of POINTS to the mandelbrot set.
+
+    Points in the main cardioid and the period-2 bulb have a
+    distance of 0 without being iterated. STATE is accepted like by
+    the other kernels, but distances are always calculated anew.
+
+    """
+    points = np.asarray(points, dtype=complex)
+    result = np.zeros(points.shape)
+    outside = ~in_cardioid_or_bulb(points)
+    result[outside] = distances(points[outside], points[outside], depth, 1)
+    return result
+
+def julia_distance(points, constant, depth, state=None):
+    """Estimate the distances of POINTS to the julia set of CONSTANT.
+
+    STATE is accepted like by the other kernels, but distances are
+    always calculated anew.
+
+    """
+    return distances(points, complex(*constant), depth, 0)
+
+def boxfold(z):
+    "Applies the boxfold operation to every value of Z."
+    x = np.where(z.real < -1, -2 - z.real,
+                 np.where(z.real > 1, 2 - z.real, z.real))
+    y = np.where(z.imag < -1, -2 - z.imag,
+                 np.where(z.imag > 1, 2 - z.imag, z.imag))
+    return x + 1j * y
+
+def ballfold(z):
+    "Applies the ballfold operation to every value of Z."
+    magnitude = z.real**2 + z.imag**2
+    divisor = np.ones(z.shape)
+    inner = magnitude < 0.25
+    divisor[inner] = 0.25
+    shell = ~inner & (magnitude < 1)
+    divisor[shell] = magnitude[shell]
+    return (z.real / divisor) + 1j * (z.imag / divisor)
+
+def mandelbox(points, scale, depth, threshold=2, state=None):
+    """Calculate the colortable indices of POINTS in the mandelbox set.
+
+    Every point is calculated at its mirror image in the quadrant of
+    negative coordinates, so that the image is symmetric to both axes.
+    If STATE is given, the iteration continues from it, see resume.
+
+    """
+    def step(z, c):
+        z = ballfold(boxfold(z))
+        return (z.real * scale + c.real) + 1j * (z.imag * scale + c.imag)
+    points = np.asarray(points, dtype=complex)
+    points = -abs(points.real) - 1j * abs(points.imag)
+    indices, values = resume(points, points, depth, step,
+                             threshold_escape(threshold), state=state)
+    return indices
+
+def logistic_map(rates, depth, y, height, transient=0, tolerance=None,
+                 chunk=256):
+    """Accumulate the orbits of x -> r * x * (1 - x) for all RATES at once.
+
+    Returns the densities as an array indexed by [rate, row], see
+    logistic_map_counts for the arguments.
+
+    """
+    for densities, iterations in logistic_map_counts(
+            rates, depth, y, height, transient, tolerance, chunk):
+        pass
+    return densities
+
+def logistic_map_counts(rates, depth, y, height, transient=0, tolerance=None,
+                        chunk=256):
+    """Accumulate the orbits of the logistic map, CHUNK iterations at a time.
+
+    Every orbit starts at 0.5. The first TRANSIENT values are
+    dropped, the following DEPTH values are counted in a column of
+    HEIGHT rows, that spans the bounds Y with the larger one at the
+    top. Each value is split between the two rows it lies between,
+    by its distance to them. Like in iterate, orbits are compared to
+    their value at the last power of two iterations. Once they come
+    back to it within TOLERANCE after at most MAX_PERIOD iterations,
+    and once more after as many iterations, without moving away, they
+    are cycling. The points of the cycle are counted as often as the
+    rest of the orbit would visit them, without iterating it. This is
+    a generator that yields the densities counted so far, as an array
+    indexed by [rate, row], and the number of iterations done for all
+    orbits so far, after every CHUNK iterations and when done.
+
+    """
+    densities = np.zeros(np.size(rates) * height)
+    samples = []
+    def count():
+        "Add the SAMPLES of lanes, values and weights to the densities."
+        lanes, x, weights = (np.concatenate(parts) for parts in zip(*samples))
+        samples.clear()
+        rows = (max(y) - x) / (max(y) - min(y)) * height
+        inside = (rows >= 0) & (rows < height)
+        floors = np.floor(rows[inside])
+        fractions = rows[inside] - floors
+        weights = weights[inside]
+        flat = lanes[inside] * height + floors.astype(int)
+        densities[:] += np.bincount(flat, (1 - fractions) * weights,
+                                    minlength=densities.size)
+        upper = (fractions != 0) & (floors + 1 < height)
+        densities[:] += np.bincount(flat[upper] + 1,
+                                    fractions[upper] * weights[upper],
+                                    minlength=densities.size)
+
+    lanes = np.arange(np.size(rates))
+    r = np.array(rates, dtype=float).ravel()
+    x = np.full(lanes.size, 0.5)
+    saved = x
+    saved_at = 0
+    iterations = 0
+    for step in range(1, transient + depth + 1):
+        if lanes.size == 0:
+            break
+        x = r * x * (1 - x)
+        iterations += lanes.size
+        # for r > 4, x escapes to -inf
+        keep = np.abs(x) <= 100
+        if step > transient:
+            samples.append((lanes, x, np.ones(lanes.size)))
+        if tolerance != None:
+            period = step - saved_at
+            cycling = keep & (period <= MAX_PERIOD) \
+                & (np.abs(x - saved) < tolerance)
+            if cycling.any():
+                # iterate one more period, because chaotic orbits come
+                # back close by chance as well, but move away again
+                cycle_lanes, cycle_r = lanes[cycling], r[cycling]
+                cycle = np.empty((period, cycle_lanes.size))
+                cycle_x = x[cycling]
+                for point in range(period):
+                    cycle_x = cycle_r * cycle_x * (1 - cycle_x)
+                    cycle[point] = cycle_x
+                iterations += period * cycle_lanes.size
+                distance = np.abs(cycle_x - x[cycling])
+                confirmed = (distance < tolerance) \
+                    & (distance <= np.abs(x - saved)[cycling])
+                # count the points of the cycle for the rest of the orbit
+                weight = (transient + depth - max(step, transient)) / period
+                confirmed_lanes = cycle_lanes[confirmed]
+                samples.append((np.tile(confirmed_lanes, period),
+                                cycle[:, confirmed].ravel(),
+                                np.full(period * confirmed_lanes.size,
+                                        weight)))
+                cycling[cycling] = confirmed
+                keep &= ~cycling
+            if step == 2 * saved_at or saved_at == 0:
+                saved, saved_at = x, step
+        if not keep.all():
+            lanes, r, x, saved = lanes[keep], r[keep], x[keep], saved[keep]
+        if len(samples) >= chunk:
+            count()
+            yield densities.reshape(np.size(rates), height), iterations
+    if samples:
+        count()
+    yield densities.reshape(np.size(rates), height), iterations
+
+def chaos_game(maps, probabilities, points, steps, x, y, hits, transient=0,
+               rng=np.random):
+    """Move the walkers at POINTS STEPS times by randomly chosen MAPS.
+
+    MAPS is an array of affine maps, each a 2 x 3 matrix that takes
+    the real and imaginary part of a point, followed by 1. In every
+    step, each walker chooses its map with PROBABILITIES by RNG.
+    After the first TRANSIENT steps, every position of a walker is
+    counted in the pixel it lies in. HITS is the array of these
+    counts, indexed by [column, row] of a canvas that spans the
+    bounds X and Y. Returns the new positions.
+
+    """
+    maps = np.asarray(maps, dtype=float)
+    coefficients = maps.reshape(len(maps), 6).T
+    thresholds = np.cumsum(probabilities) / np.sum(probabilities)
+    real, imag = np.real(points), np.imag(points)
+    width, height = hits.shape
+    column_scale = width / (max(x) - min(x))
+    row_scale = height / (max(y) - min(y))
+    pixels = []
+    for step in range(steps):
+        # the number of thresholds below a random number chooses the map
+        chances = rng.random(real.size)
+        chosen = np.zeros(real.size, dtype=np.intp)
+        for threshold in thresholds[:-1]:
+            chosen += chances >= threshold
+        a, b, e, c, d, f = (coefficient[chosen]
+                            for coefficient in coefficients)
+        real, imag = a * real + b * imag + e, c * real + d * imag + f
+        if step < transient:
+            continue
+        columns = (real - min(x)) * column_scale
+        rows = (max(y) - imag) * row_scale
+        inside = (columns >= 0) & (columns < width) \
+            & (rows >= 0) & (rows < height)
+        pixels.append(columns[inside].astype(int) * height
+                      + rows[inside].astype(int))
+        # count several steps at once, because counting costs as much
+        # as the whole canvas
+        if len(pixels) == 16 or step == steps - 1:
+            hits.reshape(-1)[:] += np.bincount(np.concatenate(pixels),
+                                               minlength=hits.size)
+            pixels = []
+    return real + 1j * imag
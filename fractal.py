@@ -1,6 +1,11 @@
+import contextlib
+import functools
 import math
+import numpy as np
+import progressive
 import pygame
-import random
+import tiles
+import time
 
 
 class Fractal():
@@ -8,20 +13,61 @@ class Fractal():
     
     This class shall not be instantiated directly.
     The class deriving from Fractal must define the functions
-    set_title and calc_point or overwrite the render function.
+    set_title, calc_point and kernel or overwrite the calculate
+    function.
+    The kernel must take the depth and the state of the iteration
+    as arguments, like the kernels in engine.
+    If the renderer member is set to a tiles.TileRenderer, the
+    fractal is calculated on its worker processes. If the cache
+    member is set to a cache.TileCache, calculated pixels are reused.
+    Connected sets can set the subdivide member to calculate by
+    rectangle subdivision. Fractals with a distance estimating
+    kernel can set the distance member to show the distances to the
+    set instead of iteration counts. Symmetric fractals declare the
+    mirrors member, so that only one of the mirror images of a pixel
+    is calculated. If the stats member is set to a stats.RenderStats,
+    the phases of rendering are timed and the calculated pixels and
+    their iterations are counted.
 
     """
 
+    # buffers of the last calculation, see progressive.Buffers
+    buffers = None
+    # whether to calculate single pixels by rectangle subdivision
+    subdivide = False
+    # whether to show estimated distances to the set
+    distance = False
+    # reflections of the lattice of pixels that leave the fractal
+    # unchanged, see progressive.symmetry
+    mirrors = ()
+    # instrumentation, see stats.RenderStats
+    stats = None
+    # color member and colortable that the palette was made for, and
+    # the palette
+    _palette = (None, None, None)
+
     def generate_colortable(self):
         "Generate the table that maps values to colors."
-        self._colortable = []
-        for v in range(self._depth):
-            val = v / (self._depth - 1) # [0; 1]
-            self._colortable.append((
-                math.floor(max(0, math.sin(1.5 * math.pi * val                 )) * 255), # red
-                math.floor(max(0, math.sin(1.5 * math.pi * val - 0.25 * math.pi)) * 255), # green
-                math.floor(max(0, math.sin(1.5 * math.pi * val - 0.5  * math.pi)) * 255), # blue
-                ))
+        val = np.arange(self._depth) / (self._depth - 1) # [0; 1]
+        self._colortable = [tuple(c) for c in self.tone(val, color=True).tolist()]
+
+    def tone(self, val, color=None):
+        """Map an array of values in [0; 1] to an array of RGB colors.
+
+        If COLOR is true, the values run through the sines of the
+        colortable, else from white to black. COLOR defaults to the
+        color member.
+
+        """
+        if color == None:
+            color = self.color
+        if not color:
+            v = ((1 - val) * 255).astype(np.uint8)
+            return np.stack((v,v,v), axis=-1)
+        # red, green and blue are the same sine, shifted
+        return np.stack([
+            np.maximum(0, np.sin(1.5 * np.pi * val - shift * np.pi)) * 255
+            for shift in (0, 0.25, 0.5)], axis=-1).astype(np.uint8)
 
     def set_depth(self, depth):
         """Set new depth to DEPTH or to 2, if DEPTH is smaller than 2.
@@ -40,7 +86,7 @@ class Fractal():
         self.generate_colortable()
 
     def get_keyevents(self):
-        events = pygame.event.get()
+        events = self.view.canvas.get_events()
         for e in events:
             if e.type == pygame.QUIT \
             or e.type == pygame.KEYDOWN \
@@ -51,8 +97,98 @@ class Fractal():
         "Pause or unpause the rendering process."
         self.paused = not self.paused
 
-    def render(self, steps=500_000):
-        "Render the fractal."
+    def calc_points(self, points):
+        "Calculate the colortable indices of an array of complex POINTS."
+        kernel, arguments = self.kernel()
+        return kernel(points, **arguments)
+
+    def palette(self):
+        """Return the RGB colors of all colortable indices as an array.
+
+        The same array is returned until the colortable or the color
+        member changes, so that canvases can keep their conversion of
+        it.
+
+        """
+        color, colortable, palette = self._palette
+        if color != self.color or colortable is not self._colortable:
+            if self.color:
+                palette = np.array(self._colortable, dtype=np.uint8)
+            else:
+                v = (np.arange(self._depth) / self._depth * 255).astype(np.uint8)
+                palette = np.stack((v,v,v), axis=-1)
+            self._palette = (self.color, self._colortable, palette)
+        return palette
+
+    def colorize(self, colorindices):
+        """Map an array of colortable indices to an array of RGB colors.
+
+        Fractional indices, like smooth iteration counts, blend the two
+        neighbouring colors of the colortable.
+
+        """
+        if not self.color:
+            v = (colorindices / self._depth * 255).astype(np.uint8)
+            return np.stack((v,v,v), axis=-1)
+        colortable = np.array(self._colortable, dtype=float)
+        lower = np.floor(colorindices).astype(int)
+        upper = np.minimum(lower + 1, self._depth - 1)
+        fraction = (colorindices - lower)[..., np.newaxis]
+        colors = (1 - fraction) * colortable[lower] + fraction * colortable[upper]
+        return colors.astype(np.uint8)
+
+    def shows_distance(self):
+        "Check whether the kernel estimates distances to the set."
+        # deep views are calculated by perturbation, which counts iterations
+        return self.distance and not self.view.is_deep()
+
+    def shade(self, distances):
+        """Map DISTANCES to the set to colortable indices.
+
+        Points closer than a pixel get the last index, like the points
+        in the set, farther points get lower indices.
+
+        """
+        pixels = distances / self.view.pixel_size()[0]
+        return (self._depth - 1) / (1 + np.log2(1 + pixels))
+
+    def timed(self, phase):
+        "Time the with block as PHASE of the stats, if there are any."
+        if self.stats == None:
+            return contextlib.nullcontext()
+        return self.stats.timed(phase)
+
+    def show_stats(self, rendering=False):
+        "Set the window title with the readout of the stats appended."
+        self.set_title(rendering)
+        self.view.canvas.set_title("{} - {}".format(
+            self.view.canvas.title, self.stats.readout()))
+
+    def draw(self, pos, colorindices):
+        """Draw an array of COLORINDICES, indexed by [column, row], at POS.
+
+        Whole indices are drawn with a single palette lookup on the
+        canvas, fractional ones are blended by colorize first. If the
+        fractal shows distances, they are shaded first.
+
+        """
+        if self.shows_distance():
+            colorindices = self.shade(colorindices)
+        whole = colorindices.astype(np.intp)
+        if (whole == colorindices).all():
+            self.view.canvas.blit_indices(pos, whole, self.palette())
+        else:
+            self.view.canvas.blit(pos, self.colorize(colorindices))
+
+    def render(self, update_interval=1/60):
+        """Render the fractal in this thread, returning early on events.
+
+        The results of calculate are drawn as soon as they are
+        finished. Events are checked and the canvas is updated every
+        UPDATE_INTERVAL seconds. Interactive programs should rather
+        use a background.RenderThread.
+
+        """
 
         # update window title
         self.set_title(rendering=True)
@@ -61,56 +197,240 @@ class Fractal():
         if self.paused:
             return self.idle()
 
-        for count in range(steps):
+        if self.stats != None:
+            self.stats.start()
+        calculation = self.calculate()
+        try:
+            next_update = time.monotonic()
+            while True:
+                with self.timed('calculate'):
+                    draw = next(calculation, None)
+                if draw == None:
+                    break
+                with self.timed('draw'):
+                    draw()
+                if time.monotonic() < next_update:
+                    continue
+                next_update = time.monotonic() + update_interval
 
-            # check for events
-            events = self.get_keyevents()
-            if events != None:
-                return events
+                # check for events
+                with self.timed('events'):
+                    events = self.get_keyevents()
+                if events != None:
+                    return events
 
-            # choose point
-            point = (min(self.view.x) + random.random() * self.view.size_x(),
-                     min(self.view.y) + random.random() * self.view.size_y())
+                with self.timed('update'):
+                    self.view.canvas.update()
+                if self.stats != None:
+                    self.show_stats(rendering=True)
+                    self.stats.tick()
+        finally:
+            calculation.close()
 
-            # calculate color
-            colorindex = self.calc_point(point)
+        return self.idle()
 
-            # Lower values for shrinking_speed make the picture stay
-            # coarse, higher values make it too long to get
-            # finer. Values between 500 and 1000 are good.
-            shrinking_speed = 750
+    def calculate(self):
+        """Calculate the fractal from coarse to fine.
 
-            # square size
-            max_size = min(self.view.canvas.width, self.view.canvas.height)
-            scale = 1 / (count / shrinking_speed + 10)
-            size = scale * max_size
+        This is a generator that yields a function for every finished
+        tile, which draws the tile when called. The levels of the
+        progressive rendering order are calculated tile by tile,
+        either in this process or on the worker processes of the
+        renderer. After the finest level every pixel has been
+        calculated exactly once and rendering is done. Pixels of the
+        previous calculation are reused if only the view or the depth
+        has changed, pixels that are found in the cache aren't
+        calculated at all, and all calculated pixels are stored in the
+        cache when done or cancelled. Pixels with a mirror image in the
+        view are copied from it after every level.
 
-            # choose color
-            if self.color:
-                color = self._colortable[colorindex]
+        """
+
+        buffers = self.get_buffers()
+        kernel, arguments = self.kernel()
+        width, height = buffers.width, buffers.height
+
+        # Reuse the pixels of the previous calculation, if it had the
+        # same parameters apart from the depth. If the pixel size is
+        # the same, move them as far as the view has moved, otherwise
+        # resample them. Then adapt them to the depth.
+        contents = self.contents()
+        parameters, pixel_size, origin, depth = contents
+        if buffers.contents == None or buffers.contents[0] != parameters:
+            buffers.clear()
+        else:
+            previous_pixel_size, previous_origin, previous_depth = \
+                buffers.contents[1:]
+            if previous_pixel_size == pixel_size:
+                dx = previous_origin[0] - origin[0]
+                dy = previous_origin[1] - origin[1]
+                if dx != 0 or dy != 0:
+                    buffers.shift(dx, dy)
+                    yield functools.partial(self.view.canvas.scroll, dx, dy)
             else:
-                v = (colorindex / self._depth) * 255
-                color = (v,v,v)
+                buffers.resample(previous_pixel_size, previous_origin,
+                                 pixel_size, origin)
+            if depth != None:
+                buffers.change_depth(previous_depth, depth)
+        buffers.contents = contents
+        symmetry = self.symmetry()
 
-            # draw square
-            self.view.square(point, color, size=size)
+        # rectangle subdivision only approximates pixels, so they are
+        # cached apart from exact ones
+        if self.subdivide:
+            cache_arguments = dict(arguments, subdivide=True)
+        else:
+            cache_arguments = arguments
+        if self.cache != None:
+            self.cache.load(kernel, cache_arguments, self.view,
+                            buffers.counts, buffers.known)
 
-            # Update every update_after steps
-            update_after = 1000
-            if count % update_after == 0:
-                self.view.canvas.update()
+        try:
+            block_sizes = progressive.block_sizes(width, height)
+            if self.subdivide:
+                # rectangle subdivision calculates the finer levels at once
+                block_sizes = [block_size for block_size in block_sizes
+                               if block_size >= progressive.RECTANGLE_SIZE]
+                block_sizes.append(1)
+            for block_size in block_sizes:
+                level_started = time.perf_counter()
+                level_calculated = 0
+                # the first level calculates mirrored pixels as well, so
+                # that every pixel has a value to paint from the start
+                if block_size == block_sizes[0]:
+                    level = self.calc_level(block_size)
+                else:
+                    level = self.calc_level(block_size, symmetry)
+                for tile, calculated, iterations in level:
+                    level_calculated += calculated
+                    if self.stats != None:
+                        self.stats.calculated += calculated
+                        self.stats.iterations += iterations
+                    # after the first level, only tiles with new pixels change
+                    if block_size != block_sizes[0] and calculated == 0:
+                        continue
+                    yield functools.partial(
+                        self.draw, (tile.x, tile.y),
+                        progressive.blocks(buffers, tile, block_size))
+                if symmetry != None:
+                    changed = progressive.mirror(buffers, symmetry,
+                                                 block_size)
+                    size = progressive.tile_size(tiles.TILE_SIZE, block_size)
+                    for tile in tiles.split(width, height, size):
+                        if changed[tile.slices()].any():
+                            yield functools.partial(
+                                self.draw, (tile.x, tile.y),
+                                progressive.blocks(buffers, tile, block_size))
+                if self.stats != None:
+                    self.stats.add_level(block_size, level_calculated,
+                                         time.perf_counter() - level_started)
+        finally:
+            # drop tiles that are still being calculated
+            if self.renderer != None:
+                self.renderer.cancel()
+            if self.cache != None:
+                self.cache.store(kernel, cache_arguments, self.view,
+                                 buffers.counts, buffers.known)
 
-        self.view.canvas.update()
-        return self.idle()
+    def contents(self):
+        """Describe what the buffers hold after calculating the view.
+
+        This snaps the view to the lattice of pixels. Pixels that are
+        approximated by rectangle subdivision aren't reused for an
+        exact calculation, and the other way round.
+
+        """
+        kernel, arguments = self.kernel()
+        self.view.snap()
+        if self.shows_distance():
+            # distances can't be adapted to another depth
+            return ((kernel, arguments, self.subdivide),
+                    self.view.pixel_size(), self.view.origin(), None)
+        return ((kernel, dict(arguments, depth=None), self.subdivide),
+                self.view.pixel_size(), self.view.origin(), arguments['depth'])
+
+    def symmetry(self):
+        """Return the progressive.Symmetry of the view, or None.
+
+        Deep views have no symmetry, because their lattice is relative
+        to the reference point.
+
+        """
+        if not self.mirrors or self.view.is_deep():
+            return None
+        return progressive.symmetry(
+            self.view.origin(), self.mirrors,
+            (self.view.canvas.width, self.view.canvas.height))
+
+    def recolor(self):
+        """Draw the calculated pixels again, with the current colors.
+
+        Nothing is calculated, so this is only possible if the buffers
+        hold every pixel of the view. Returns whether the fractal was
+        drawn.
+
+        """
+        if self.buffers == None or self.buffers.contents != self.contents() \
+        or not self.buffers.known.all():
+            return False
+        self.draw((0, 0), self.buffers.counts)
+        return True
+
+    def get_buffers(self):
+        """Return the buffers to calculate in.
+
+        These are the buffers in shared memory of the renderer, if
+        there is one.
+
+        """
+        width, height = self.view.canvas.width, self.view.canvas.height
+        if self.renderer != None:
+            self.buffers = self.renderer.buffers
+        elif self.buffers == None \
+        or (self.buffers.width, self.buffers.height) != (width, height):
+            self.buffers = progressive.Buffers(width, height)
+        return self.buffers
+
+    def calc_level(self, block_size, symmetry=None):
+        """Calculate the level of BLOCK_SIZE and yield its tiles as they are finished.
+
+        Together with each tile, the numbers of pixels that have been
+        calculated in it and of the iterations done for them are
+        yielded. Pixels that are copied by SYMMETRY aren't calculated.
+
+        """
+        kernel, arguments = self.kernel()
+        if self.renderer != None:
+            self.renderer.submit(kernel, arguments, self.view, block_size,
+                                 self.subdivide, self.shows_distance(),
+                                 symmetry)
+            yield from self.renderer.finished()
+            return
+        width, height = self.buffers.width, self.buffers.height
+        size = progressive.tile_size(tiles.TILE_SIZE, block_size,
+                                     self.subdivide)
+        for tile in tiles.split(width, height, size):
+            yield (tile,) + progressive.calculate(
+                kernel, arguments, self.view.x, self.view.y, tile,
+                block_size, self.buffers, self.subdivide,
+                self.shows_distance(), symmetry)
 
     def idle(self):
         "Commit surface, set window title, and idle until next event."
         self.paused = True
         self.view.canvas.update()
-        self.set_title(rendering=False)
+        if self.stats != None:
+            self.show_stats(rendering=False)
+            self.stats.log()
+        else:
+            self.set_title(rendering=False)
+        # without a window there are no events to wait for
+        if not self.view.canvas.interactive:
+            return []
+        clock = pygame.time.Clock()
         while True:
             events = self.get_keyevents()
             if events != None:
                 return events
             pygame.display.update()
-            pygame.time.Clock().tick(60)
+            clock.tick(60)
@@ -0,0 +1,116 @@
+"""Iterated function systems, drawn by the chaos game.
+
+The attractor of a set of contracting affine maps is the set of
+points that is mapped onto itself. A walker that is moved by randomly
+chosen maps soon lies on the attractor and visits all of it, so the
+attractor is drawn by counting the visits of many walkers to every
+pixel.
+
+"""
+
+import engine
+import fractal
+import functools
+import math
+import numpy as np
+
+
+class IteratedFunctionSystem(fractal.Fractal):
+    """Represents the attractor of an iterated function system.
+
+    This class shall not be instantiated directly. The class
+    deriving from it must set the maps and probabilities members,
+    see engine.chaos_game, and define set_title. The attractor is
+    drawn in VIEW. DEPTH is the number of points that are drawn, by
+    WALKERS walkers at once. The density of the points is shown with
+    log tone mapping.
+
+    """
+
+    # steps that the walkers take to reach the attractor
+    transient = 30
+    # points that are drawn before the canvas is updated
+    update_after = 2_000_000
+    # hits of the last calculation
+    hits = None
+    # what the hits have been counted for once they are complete, see
+    # contents
+    counted = None
+
+    def __init__(self, view, depth=10_000_000, allowed_keyevents=[],
+                 color=False, walkers=2**16):
+        self.paused = False
+        self._depth = depth
+        self.color = color
+        self.walkers = walkers
+        self.view = view
+        self.allowed_keyevents = allowed_keyevents
+        self.set_title(rendering=False)
+
+    def set_depth(self, depth):
+        "Set new depth to abs(DEPTH)."
+        if depth == 0 or depth == self._depth:
+            return
+        self._depth = math.ceil(abs(depth))
+        # there's no colortable, the densities are tone mapped
+
+    def calculate(self):
+        """Calculate the attractor by the chaos game.
+
+        This is a generator that yields a function for every
+        update_after points, which draws the whole canvas when called.
+
+        """
+        width, height = self.view.canvas.width, self.view.canvas.height
+        self.hits = hits = np.zeros((width, height))
+        self.counted = None
+        walkers = min(self.walkers, self._depth)
+        rng = np.random.default_rng()
+        points = rng.random(walkers) + 1j * rng.random(walkers)
+        points = engine.chaos_game(self.maps, self.probabilities, points,
+                                   self.transient, self.view.x, self.view.y,
+                                   hits, self.transient, rng)
+        if self.stats != None:
+            self.stats.iterations += self.transient * walkers
+        drawn = 0
+        while drawn < self._depth:
+            steps = max(1, min(self.update_after,
+                               self._depth - drawn) // walkers)
+            points = engine.chaos_game(self.maps, self.probabilities, points,
+                                       steps, self.view.x, self.view.y, hits,
+                                       rng=rng)
+            drawn += steps * walkers
+            if self.stats != None:
+                self.stats.calculated += steps * walkers
+                self.stats.iterations += steps * walkers
+            yield functools.partial(self.view.canvas.blit, (0, 0),
+                                    self.colorize(hits))
+        self.counted = self.contents()
+
+    def contents(self):
+        "Describe what the hits are counted for."
+        return (tuple(self.view.x), tuple(self.view.y), self._depth,
+                self.view.canvas.width, self.view.canvas.height)
+
+    def recolor(self):
+        """Draw the hits again, with the current colors.
+
+        Nothing is counted, so this is only possible if all points of
+        the view have been drawn. Returns whether the attractor was
+        drawn.
+
+        """
+        if self.counted == None or self.counted != self.contents():
+            return False
+        self.view.canvas.blit((0, 0), self.colorize(self.hits))
+        return True
+
+    def colorize(self, hits):
+        """Map an array of HITS to an array of RGB colors.
+
+        The logarithm of the hits is scaled to the one of the most
+        hit pixel, so that sparse parts of the attractor stay visible.
+
+        """
+        val = np.log1p(hits) / max(1, np.log1p(hits.max()))
+        return self.tone(val)
@@ -1,21 +1,33 @@
+import engine
 import fractal
+import perturbation
 import view
 
 class Julia(fractal.Fractal):
     "Represents julia sets."
 
+    # symmetric to the origin, because z and -z have the same square
+    mirrors = ((-1, -1),)
+
     def __init__(self, super, canvas, depth=100, constant=(0.7,0.3),
-                 color=True, threshold=2, allowed_keyevents=[]):
+                 color=True, threshold=2, smooth=False,
+                 allowed_keyevents=[], renderer=None, cache=None,
+                 subdivide=False, distance=False):
         self.paused = False
         # set parameters
         self._depth = depth
         self.generate_colortable()
         self.threshold = threshold
+        self.smooth = smooth
         self.constant = constant
         self.color = color
         # make view
-        self.view = view.View(canvas, x=(-1.5,1.5), y=(-1.5,1.5))
+        self.view = view.View(canvas, x=(-1.5,1.5), y=(-1.5,1.5), deep=True)
         self.allowed_keyevents = allowed_keyevents
+        self.renderer = renderer
+        self.cache = cache
+        self.subdivide = subdivide
+        self.distance = distance
         self.set_title("Julia")
         # log
         self.print_constant()
@@ -32,10 +44,32 @@ class Julia(fractal.Fractal):
         for colortable_index in range(self._depth):
             point = ( point[0]**2 - point[1]**2 + self.constant[0],
                   2 * point[0] * point[1] + self.constant[1] )
-            if point[0] > self.threshold or point[1] > self.threshold:
+            if point[0]**2 + point[1]**2 > self.threshold**2:
                 break
         return colortable_index
 
+    def kernel(self):
+        """Return the vectorized kernel of the julia set and its arguments.
+
+        Views beyond the precision of floats are calculated by
+        perturbation. If the distance member is set, the distances to
+        the set are estimated instead.
+
+        """
+        if self.view.is_deep():
+            return perturbation.julia, {'reference': self.view.reference,
+                                        'constant': self.constant,
+                                        'depth': self._depth,
+                                        'threshold': self.threshold,
+                                        'smooth': self.smooth}
+        if self.distance:
+            return engine.julia_distance, {'constant': self.constant,
+                                           'depth': self._depth}
+        return engine.julia, {'constant': self.constant,
+                              'depth': self._depth,
+                              'threshold': self.threshold,
+                              'smooth': self.smooth}
+
     def print_constant(self):
         "Print julia constant."
         print("Julia constant: ({}, {})"
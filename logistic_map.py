@@ -1,13 +1,31 @@
+import engine
 import fractal
+import functools
 import math
-import random
+import numpy as np
 import view
 
 class LogisticMap(fractal.Fractal):
-    "Represents the bifurcation diagram of the logistic map."
+    """Represents the bifurcation diagram of the logistic map.
+
+    The first TRANSIENT values of every orbit aren't drawn. Orbits
+    that come back to a value within TOLERANCE pixels are cycling,
+    see engine.logistic_map.
+
+    """
+
+    # columns that are calculated at once
+    columns_at_once = 512
+    # iterations of the columns that are done before they are drawn
+    update_after = 2048
+    # densities of the last calculation, indexed by [column, row]
+    densities = None
+    # what the densities have been counted for once they are complete,
+    # see contents
+    counted = None
 
     def __init__(self, canvas, depth=None, allowed_keyevents=[],
-                 color=False):
+                 color=False, transient=100, tolerance=1e-3):
         self.paused = False
         # make view
         self.view = view.View(canvas, x=(3.5,4.0), y=(0,1))
@@ -19,6 +37,8 @@ class LogisticMap(fractal.Fractal):
         else:
             self._depth = depth
         self.color = color
+        self.transient = transient
+        self.tolerance = tolerance
 
     def set_title(self, rendering=False):
         "Sets the window title, indicating if rendering is in process."
@@ -35,103 +55,96 @@ class LogisticMap(fractal.Fractal):
         # the logistic map doesn't have a colortable, because the size
         # of that table would vary from column to column
 
-    def render(self):
-        "Render the logistic map"
+    def calculate(self):
+        """Calculate the logistic map in passes of narrower and narrower bars.
 
-        # update window title
-        self.set_title(rendering=True)
+        This is a generator that yields a function for every
+        update_after iterations, which draws the columns that are
+        being calculated when called. Every pass calculates the
+        columns between the ones of the previous passes,
+        columns_at_once at a time, and every calculated column is
+        painted as a bar up to the next one.
 
-        # idle if paused
-        if self.paused:
-            return self.idle()
+        """
+        width = self.view.canvas.width
+        height = self.view.canvas.height
 
         # minimum amount of bars we want to have
         min_bars = 50
 
         # calculate maximum bar_width
         max_bar_width = 1
-        while min_bars * max_bar_width * 2 < self.view.canvas.width:
+        while min_bars * max_bar_width * 2 < width:
             max_bar_width *= 2
 
         # decrease bar width over time
+        self.densities = np.zeros((width, height))
+        self.counted = None
+        colors = np.zeros((width, height, 3), dtype=np.uint8)
+        column_width = self.view.size_x() / width
         bar_width = max_bar_width
-        count = 0
         while bar_width >= 1:
 
-            # draw bars
-            for col_num in range(int(self.view.canvas.width // bar_width + 1)):
-
-                # check for events
-                events = self.get_keyevents()
-                if events != None:
-                    return events
-
-                # choose column
-                column = int(bar_width * col_num)
-
-                # skip column if already calculated
-                skip_width = 2 * bar_width
-                skip = False
-                while skip_width < max_bar_width:
-                    if column % skip_width == 0:
-                        skip = True
-                        break
-                    skip_width *= 2
-                if skip:
-                    continue
-
-                # calculate column position in view
-                column_width = self.view.size_x() / self.view.canvas.width
-                r = min(self.view.x) + column * column_width
-
-                # calculate column
-                x = 0.5
-                col = [0] * self.view.canvas.height
-                for d in range(math.ceil(self._depth)):
-                    x = r * x * (1 - x)
-                    # for r > 4, x escapes to -inf
-                    if abs(x) > 100:
-                        break
-                    row = (max(self.view.y) - x) / self.view.size_y() * self.view.canvas.height
-                    if row >= 0 and row < len(col):
-                        distance_to_floor = row - math.floor(row)
-                        col[math.floor(row)] += 1 - distance_to_floor
-                        if distance_to_floor != 0 and row <= len(col) - 1:
-                            distance_to_ceil = math.ceil(row) - row
-                            col[math.ceil(row)] += 1 - distance_to_ceil
-
-                # draw column
-                max_value = max(1, max(col))
-                for row in range(len(col)):
-
-                    # calculate color
-                    val = col[row] / max_value
-                    if self.color:
-                        color = (
-                            math.floor(max(0, math.sin(1.5 * math.pi * val                 )) * 255), # red
-                            math.floor(max(0, math.sin(1.5 * math.pi * val - 0.25 * math.pi)) * 255), # green
-                            math.floor(max(0, math.sin(1.5 * math.pi * val - 0.5  * math.pi)) * 255), # blue
-                        )
-                    else:
-                        color = ((1 - val) * 255,
-                                 (1 - val) * 255,
-                                 (1 - val) * 255)
-
-                    # draw line
-                    self.view.canvas.rectangle(
-                        (math.floor(column), row),
-                        (math.floor(column+bar_width), row+1), color=color)
-
-                # Update every update_after steps
-                update_after = 50
-                if count % update_after == 0:
-                    self.view.canvas.update()
-                count += 1
-
-            # update every time the whole canvas has been filled with bars
-            self.view.canvas.update()
+            # choose the columns that haven't been calculated yet
+            columns = np.arange(0, width, bar_width)
+            if bar_width != max_bar_width:
+                columns = columns[columns % (2 * bar_width) != 0]
+
+            for first in range(0, columns.size, self.columns_at_once):
+                chunk = columns[first:first + self.columns_at_once]
+                # the bars of the chunk and the ones between them
+                left = chunk[0]
+                right = min(width, chunk[-1] + bar_width)
+
+                # calculate the columns, drawing them every now and then
+                rates = min(self.view.x) + chunk * column_width
+                done = 0
+                for densities, iterations in engine.logistic_map_counts(
+                        rates, math.ceil(self._depth), self.view.y, height,
+                        self.transient,
+                        self.tolerance * self.view.size_y() / height,
+                        self.update_after):
+                    if self.stats != None:
+                        self.stats.iterations += iterations - done
+                    done = iterations
+                    self.densities[chunk] = densities
+                    colors[chunk] = self.colorize(densities)
+                    bars = np.repeat(colors[left:right:bar_width], bar_width,
+                                     axis=0)[:right - left]
+                    yield functools.partial(self.view.canvas.blit, (left, 0),
+                                            bars)
+                if self.stats != None:
+                    self.stats.calculated += chunk.size * height
 
             # half bar width and repeat
-            bar_width /= 2
+            bar_width //= 2
+        self.counted = self.contents()
+
+    def contents(self):
+        "Describe what the densities are counted for."
+        return (tuple(self.view.x), tuple(self.view.y), self._depth,
+                self.transient, self.tolerance,
+                self.view.canvas.width, self.view.canvas.height)
+
+    def recolor(self):
+        """Draw the densities again, with the current colors.
+
+        Nothing is calculated, so this is only possible if every
+        column of the view has been calculated. Returns whether the
+        logistic map was drawn.
+
+        """
+        if self.counted == None or self.counted != self.contents():
+            return False
+        self.view.canvas.blit((0, 0), self.colorize(self.densities))
+        return True
+
+    def colorize(self, densities):
+        """Map the DENSITIES of columns to an array of RGB colors.
+
+        Both are indexed by [column, row]. Every column is scaled to
+        its own maximum density.
 
-        return self.idle()
+        """
+        val = densities / np.maximum(1, densities.max(axis=1, keepdims=True))
+        return self.tone(val)
@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
 
+import barnsley_fern
 import julia
 import logistic_map
 import mandelbox
 import mandelbrot
 import sierpinski
 
+import background
+import cache
 import canvas
+import contextlib
 import math
 import pygame
+import stats
+import tiles
 import view
 
 
-canvas = canvas.Canvas(800, 600)
-
 general_keys = [
     pygame.K_q,      # quit
     pygame.K_SPACE,  # pause rendering
@@ -28,29 +32,37 @@ general_keys = [
     pygame.K_PERIOD, # increase depth
     pygame.K_COMMA,  # decrease depth
     pygame.K_c,      # toggle color
+    pygame.K_i,      # toggle render stats
+]
+
+connected_set_keys = [
+    pygame.K_m,      # toggle rectangle subdivision
+    pygame.K_e,      # toggle distance estimation
 ]
 
 def make_mandelbrot():
     m = mandelbrot.Mandelbrot(
-        canvas, allowed_keyevents=general_keys)
+        canvas, allowed_keyevents=general_keys + connected_set_keys,
+        renderer=renderer, cache=tile_cache)
     m.view.rectify()
     return m
 
 def make_julia():
     j = julia.Julia(
         make_mandelbrot(),
-        canvas, allowed_keyevents=general_keys + [
+        canvas, allowed_keyevents=general_keys + connected_set_keys + [
             pygame.K_w,      # move julia constant up
             pygame.K_a,      # move julia constant left
             pygame.K_s,      # move julia constant down
             pygame.K_d,      # move julia constant right
-        ])
+        ], renderer=renderer, cache=tile_cache)
     j.view.rectify()
     return j
 
 def make_mandelbox():
     m = mandelbox.Mandelbox(
-        canvas, allowed_keyevents=general_keys)
+        canvas, allowed_keyevents=general_keys, renderer=renderer,
+        cache=tile_cache)
     m.view.rectify()
     return m
 
@@ -66,15 +78,21 @@ def make_sierpinski():
     s.view.rectify()
     return s
 
+def make_barnsley_fern():
+    b = barnsley_fern.BarnsleyFern(
+        canvas, allowed_keyevents=general_keys)
+    b.view.rectify()
+    return b
+
 def make_fractals(fractal_i=None):
     global fractals
     # maybe initialize
-    if len(fractals) != 5:
-        fractals = [None, None, None, None, None]
+    if len(fractals) != 6:
+        fractals = [None, None, None, None, None, None]
         fractal_i = None
     # make all fractals
     if fractal_i == None:
-        for i in range(5):
+        for i in range(6):
             make_fractals(fractal_i=i)
     elif fractal_i == 0:
         fractals[fractal_i] = make_mandelbrot()
@@ -86,91 +104,173 @@ def make_fractals(fractal_i=None):
         fractals[fractal_i] = make_logistic_map()
     elif fractal_i == 4:
         fractals[fractal_i] = make_sierpinski()
+    elif fractal_i == 5:
+        fractals[fractal_i] = make_barnsley_fern()
 
-# create fractals
-fractals = []
-make_fractals()
-fractal_i = 0
-
-# event loop
-while True:
-    events = fractals[fractal_i].render()
-    for e in events:
-        # quit
-        if e.type == pygame.QUIT:
-            pygame.quit()
-            quit()
-        # keys
-        elif e.type == pygame.KEYDOWN:
+def timed(render_thread, fractal, phase):
+    """Time the with block as PHASE of the stats of FRACTAL.
 
+    Only the frames of a running RENDER_THREAD are timed, so the stats
+    of a finished render don't grow while the window idles.
+
+    """
+    if not render_thread.running():
+        return contextlib.nullcontext()
+    return fractal.timed(phase)
+
+def main():
+    global canvas, renderer, tile_cache, fractals
+
+    canvas = canvas.Canvas(800, 600)
+    renderer = tiles.TileRenderer(canvas.width, canvas.height)
+    tile_cache = cache.TileCache()
+
+    # create fractals
+    fractals = []
+    make_fractals()
+    fractal_i = 0
+
+    # calculate in the background
+    render_thread = background.RenderThread()
+    render_thread.start(fractals[fractal_i])
+    rendering = None
+
+    # event loop, running at a fixed frame rate
+    clock = pygame.time.Clock()
+    while True:
+        with timed(render_thread, fractals[fractal_i], 'events'):
+            events = pygame.event.get()
+        for e in events:
             # quit
-            if e.key == pygame.K_q:
+            if e.type == pygame.QUIT:
+                render_thread.cancel()
+                renderer.close()
                 pygame.quit()
                 quit()
+            # keys
+            elif e.type == pygame.KEYDOWN \
+            and e.key in fractals[fractal_i].allowed_keyevents:
+
+                # stop calculating before anything changes
+                render_thread.cancel()
+
+                # quit
+                if e.key == pygame.K_q:
+                    renderer.close()
+                    pygame.quit()
+                    quit()
+
+                # pause/unpause rendering
+                elif e.key == pygame.K_SPACE:
+                    fractals[fractal_i].toggle_pause()
+
+                # cycle fractals
+                elif e.key == pygame.K_f:
+                    fractal_i += 1
+                    if fractal_i >= len(fractals):
+                        fractal_i = 0
+                    fractals[fractal_i].paused = False
+
+                # reset
+                elif e.key == pygame.K_r:
+                    make_fractals(fractal_i=fractal_i)
+                    fractals[fractal_i].paused = False
+
+                # zooming
+                elif e.key == pygame.K_PLUS:
+                    fractals[fractal_i].view.zoom(factor=2)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_MINUS:
+                    fractals[fractal_i].view.zoom(factor=0.5)
+                    fractals[fractal_i].paused = False
+
+                # moving around
+                elif e.key == pygame.K_UP:
+                    fractals[fractal_i].view.move(view.Direction.UP)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_DOWN:
+                    fractals[fractal_i].view.move(view.Direction.DOWN)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_LEFT:
+                    fractals[fractal_i].view.move(view.Direction.LEFT)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_RIGHT:
+                    fractals[fractal_i].view.move(view.Direction.RIGHT)
+                    fractals[fractal_i].paused = False
+
+                # changing depth
+                elif e.key == pygame.K_PERIOD:
+                    fractals[fractal_i].set_depth(fractals[fractal_i]._depth * 1.1)
+                    print("Set depth to", fractals[fractal_i]._depth)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_COMMA:
+                    fractals[fractal_i].set_depth(fractals[fractal_i]._depth / 1.1)
+                    print("Set depth to", fractals[fractal_i]._depth)
+                    fractals[fractal_i].paused = False
+
+                # moving julia constant
+                elif e.key == pygame.K_w:
+                    fractals[fractal_i].move_constant(view.Direction.UP)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_s:
+                    fractals[fractal_i].move_constant(view.Direction.DOWN)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_a:
+                    fractals[fractal_i].move_constant(view.Direction.LEFT)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_d:
+                    fractals[fractal_i].move_constant(view.Direction.RIGHT)
+                    fractals[fractal_i].paused = False
+
+                # toggle color
+                elif e.key == pygame.K_c:
+                    fractals[fractal_i].color = not fractals[fractal_i].color
+                    # only calculate if the fractal isn't finished yet
+                    if not fractals[fractal_i].recolor():
+                        fractals[fractal_i].paused = False
+
+                # toggle render stats in the title and on the console
+                elif e.key == pygame.K_i:
+                    if fractals[fractal_i].stats == None:
+                        fractals[fractal_i].stats = stats.RenderStats(
+                            log_interval=1)
+                    else:
+                        fractals[fractal_i].stats = None
+
+                # toggle rectangle subdivision
+                elif e.key == pygame.K_m:
+                    fractals[fractal_i].subdivide = not fractals[fractal_i].subdivide
+                    print("Rectangle subdivision:", fractals[fractal_i].subdivide)
+                    fractals[fractal_i].paused = False
+                elif e.key == pygame.K_e:
+                    fractals[fractal_i].distance = not fractals[fractal_i].distance
+                    print("Distance estimation:", fractals[fractal_i].distance)
+                    fractals[fractal_i].paused = False
+
+                # start calculating again, dropping stale results
+                if not fractals[fractal_i].paused:
+                    render_thread.start(fractals[fractal_i])
+                rendering = None
+
+        # draw finished results
+        render_thread.draw()
+        with timed(render_thread, fractals[fractal_i], 'update'):
+            canvas.update()
+        if rendering != render_thread.running():
+            finished = rendering == True
+            rendering = render_thread.running()
+            fractals[fractal_i].set_title(rendering=rendering)
+            if finished:
+                # a finished render isn't started again, unless a key
+                # changes what is shown
+                fractals[fractal_i].paused = True
+                # log every finished render
+                if fractals[fractal_i].stats != None:
+                    fractals[fractal_i].stats.log()
+        if fractals[fractal_i].stats != None:
+            fractals[fractal_i].show_stats(rendering=rendering)
+            fractals[fractal_i].stats.tick()
+        clock.tick(60)
 
-            # pause/unpause rendering
-            elif e.key == pygame.K_SPACE:
-                fractals[fractal_i].toggle_pause()
-
-            # cycle fractals
-            elif e.key == pygame.K_f:
-                fractal_i += 1
-                if fractal_i >= len(fractals):
-                    fractal_i = 0
-                fractals[fractal_i].paused = False
-
-            # reset
-            elif e.key == pygame.K_r:
-                make_fractals(fractal_i=fractal_i)
-                fractals[fractal_i].paused = False
-
-            # zooming
-            elif e.key == pygame.K_PLUS:
-                fractals[fractal_i].view.zoom(factor=2)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_MINUS:
-                fractals[fractal_i].view.zoom(factor=0.5)
-                fractals[fractal_i].paused = False
-
-            # moving around
-            elif e.key == pygame.K_UP:
-                fractals[fractal_i].view.move(view.Direction.UP)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_DOWN:
-                fractals[fractal_i].view.move(view.Direction.DOWN)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_LEFT:
-                fractals[fractal_i].view.move(view.Direction.LEFT)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_RIGHT:
-                fractals[fractal_i].view.move(view.Direction.RIGHT)
-                fractals[fractal_i].paused = False
-
-            # changing depth
-            elif e.key == pygame.K_PERIOD:
-                fractals[fractal_i].set_depth(fractals[fractal_i]._depth * 1.1)
-                print("Set depth to", fractals[fractal_i]._depth)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_COMMA:
-                fractals[fractal_i].set_depth(fractals[fractal_i]._depth / 1.1)
-                print("Set depth to", fractals[fractal_i]._depth)
-                fractals[fractal_i].paused = False
-
-            # moving julia constant
-            elif e.key == pygame.K_w:
-                fractals[fractal_i].move_constant(view.Direction.UP)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_s:
-                fractals[fractal_i].move_constant(view.Direction.DOWN)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_a:
-                fractals[fractal_i].move_constant(view.Direction.LEFT)
-                fractals[fractal_i].paused = False
-            elif e.key == pygame.K_d:
-                fractals[fractal_i].move_constant(view.Direction.RIGHT)
-                fractals[fractal_i].paused = False
-
-            # toggle color
-            elif e.key == pygame.K_c:
-                fractals[fractal_i].color = not fractals[fractal_i].color
-                fractals[fractal_i].paused = False
+if __name__ == '__main__':
+    main()
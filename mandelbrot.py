@@ -1,22 +1,32 @@
+import engine
 import fractal
-import random
+import perturbation
 import view
 
 
 class Mandelbrot(fractal.Fractal):
     "Represents the mandelbrot set."
 
+    # symmetric to the real axis
+    mirrors = ((1, -1),)
+
     def __init__(self, canvas, depth=100, color=True,
-                 threshold=2, allowed_keyevents=[]):
+                 threshold=2, smooth=False, allowed_keyevents=[],
+                 renderer=None, cache=None, subdivide=False, distance=False):
         self.paused = False
         # set parameters
         self._depth = depth
         self.generate_colortable()
         self.threshold = threshold
+        self.smooth = smooth
         self.color = color
         # make view
-        self.view = view.View(canvas, x=(-2.1,0.9), y=(-1.1,1.1))
+        self.view = view.View(canvas, x=(-2.1,0.9), y=(-1.1,1.1), deep=True)
         self.allowed_keyevents = allowed_keyevents
+        self.renderer = renderer
+        self.cache = cache
+        self.subdivide = subdivide
+        self.distance = distance
         self.set_title(rendering=False)
 
     def set_title(self, rendering=False):
@@ -26,78 +36,48 @@ class Mandelbrot(fractal.Fractal):
         else:
             self.view.canvas.set_title("Mandelbrot")
 
-    def calc_point(self, point):
-        "Calculate whether POINT is within the mandelbrot set."
+    def calc_point(self, point, tolerance=1e-12):
+        """Calculate whether POINT is within the mandelbrot set.
+
+        Points in the main cardioid and the period-2 bulb return
+        immediately. Orbits are compared to their value at the last
+        power of two iterations and stop once they come back to it
+        within TOLERANCE, because they are cycling.
+
+        """
+        if engine.in_cardioid_or_bulb(complex(*point)):
+            return self._depth - 1
         constant = point
+        saved = point
+        save_at = 1
         for colortable_index in range(self._depth):
             point = ( point[0]**2 - point[1]**2 + constant[0],
                   2 * point[0] * point[1] + constant[1] )
-            if point[0] > self.threshold or point[1] > self.threshold:
+            if point[0]**2 + point[1]**2 > self.threshold**2:
                 break
+            if (point[0] - saved[0])**2 + (point[1] - saved[1])**2 \
+               < tolerance**2:
+                return self._depth - 1
+            if colortable_index + 1 == save_at:
+                saved = point
+                save_at *= 2
         return colortable_index
 
-    def render(self, steps=500_000):
-        """Render the mandelbrot.
-        
-        The difference between Fractal.render and Mandelbrot.render
-        is, that the latter leverages mandelbrot's symmetry along the
-        Y axis by calculating only two quadrants of the coordinate
-        system and mirroring it to the other two quadrants. When two
-        quadrants with different signage of Y are in view, this
-        increases the percepted rendering speed twofold.
-
-        """
-
-        # update window title
-        self.set_title(rendering=True)
-
-        # idle if paused
-        if self.paused:
-            return self.idle()
-
-        for count in range(steps):
+    def kernel(self):
+        """Return the vectorized kernel of the mandelbrot set and its arguments.
 
-            # check for events
-            events = self.get_keyevents()
-            if events != None:
-                return events
+        Views beyond the precision of floats are calculated by
+        perturbation. If the distance member is set, the distances to
+        the set are estimated instead.
 
-            # choose point
-            point = (min(self.view.x) + random.random() * self.view.size_x(),
-                     min(self.view.y) + random.random() * self.view.size_y())
-
-            # move point to 1st or 2nd quadrant
-            point = (point[0], abs(point[1]))
-
-            # calculate color
-            colorindex = self.calc_point(point)
-
-            # Lower values for shrinking_speed make the picture stay
-            # coarse, higher values make it too long to get
-            # finer. Values between 500 and 1000 are good.
-            shrinking_speed = 750
-
-            # square size
-            max_size = min(self.view.canvas.width, self.view.canvas.height)
-            scale = 1 / (count / shrinking_speed + 10)
-            size = scale * max_size
-
-            # choose color
-            if self.color:
-                color = self._colortable[colorindex]
-            else:
-                v = (colorindex / self._depth) * 255
-                color = (v,v,v)
-
-            # draw squares for y>=0 and y<=0
-            for y_mul in range(-1,2,2):
-                p = (point[0], point[1] * y_mul)
-                self.view.square(p, color, size=size)
-
-            # Update every update_after steps
-            update_after = 1000
-            if count % update_after == 0:
-                self.view.canvas.update()
-
-        self.view.canvas.update()
-        return self.idle()
+        """
+        if self.view.is_deep():
+            return perturbation.mandelbrot, {'reference': self.view.reference,
+                                             'depth': self._depth,
+                                             'threshold': self.threshold,
+                                             'smooth': self.smooth}
+        if self.distance:
+            return engine.mandelbrot_distance, {'depth': self._depth}
+        return engine.mandelbrot, {'depth': self._depth,
+                                   'threshold': self.threshold,
+                                   'smooth': self.smooth}
@@ -0,0 +1,131 @@
+"""Deep zoom by perturbation theory.
+
+Below a pixel size of about 1e-12, floats can't tell the points of
+neighbouring pixels apart anymore. Instead, one reference orbit is
+calculated in arbitrary precision, and every pixel only iterates the
+difference of its orbit to the reference orbit. These differences are
+small numbers, which floats hold precisely enough.
+
+"""
+
+import decimal
+import engine
+import fractions
+import functools
+import numpy as np
+
+
+@functools.lru_cache(maxsize=8)
+def reference_orbit(start, constant, steps, threshold):
+    """Iterate z -> z^2 + CONSTANT from START in arbitrary precision.
+
+    START and CONSTANT are pairs of fractions. The precision is
+    derived from their denominators. Returns an array of the complex
+    values of the orbit, up to STEPS iterations or until it escapes
+    THRESHOLD.
+
+    """
+    digits = max(len(str(v.denominator)) for v in start + constant)
+    with decimal.localcontext() as context:
+        context.prec = digits + 20
+        x, y, cx, cy = (decimal.Decimal(v.numerator) / v.denominator
+                        for v in start + constant)
+        bailout = threshold**2
+        orbit = [complex(float(x), float(y))]
+        for step in range(steps):
+            x, y = x * x - y * y + cx, 2 * x * y + cy
+            orbit.append(complex(float(x), float(y)))
+            if x * x + y * y > bailout:
+                break
+    return np.array(orbit)
+
+def iterate(dz, dc, orbit, start, depth, threshold):
+    """Iterate the differences DZ to ORBIT at most DEPTH times.
+
+    DC are the differences of the constants to the one of ORBIT and
+    all lanes start at index START of ORBIT. Returns colortable
+    indices and values like engine.iterate.
+
+    A lane glitches when its difference grows larger than its value,
+    because the difference loses the precision the value needs, or
+    when the reference orbit escapes before the lane does. Glitching
+    lanes are rebased: they continue from the start of ORBIT, with
+    their value as difference to it.
+
+    """
+    shape = np.shape(dz)
+    dz = np.array(dz, dtype=complex).ravel()
+    dc = np.array(np.broadcast_to(dc, shape), dtype=complex).ravel()
+    indices = np.full(dz.size, depth - 1, dtype=np.int32)
+    values = np.zeros(dz.size, dtype=complex)
+    lanes = np.arange(dz.size)
+    positions = np.full(dz.size, start)
+    z = orbit[positions] + dz
+    bailout = threshold**2
+    last = len(orbit) - 1
+    for colortable_index in range(depth):
+        if lanes.size == 0:
+            break
+        dz = (2 * orbit[positions] + dz) * dz + dc
+        positions += 1
+        z = orbit[positions] + dz
+        done = z.real**2 + z.imag**2 > bailout
+        if done.any():
+            indices[lanes[done]] = colortable_index
+            values[lanes[done]] = z[done]
+            keep = ~done
+            lanes, dz, dc, positions, z = \
+                lanes[keep], dz[keep], dc[keep], positions[keep], z[keep]
+        glitched = (z.real**2 + z.imag**2 < dz.real**2 + dz.imag**2) \
+            | (positions == last)
+        dz[glitched] = z[glitched] - orbit[0]
+        positions[glitched] = 0
+    values[lanes] = z
+    return indices.reshape(shape), values.reshape(shape)
+
+def keep_state(state, indices, values, threshold):
+    """Write the escaped lanes into STATE, see engine.resume.
+
+    The other lanes are marked as not iterated, because their
+    position on the reference orbit isn't kept.
+
+    """
+    if state == None:
+        return
+    escaped = values.real**2 + values.imag**2 > threshold**2
+    state[0][:] = values
+    state[1][:] = np.where(escaped, indices, 0)
+    state[2][:] = escaped
+
+def mandelbrot(points, reference, depth, threshold=2, smooth=False,
+               state=None):
+    """Calculate the colortable indices of POINTS in the mandelbrot set.
+
+    POINTS are the differences to REFERENCE, a pair of fractions.
+    See engine.mandelbrot for the other arguments.
+
+    """
+    zero = (fractions.Fraction(0), fractions.Fraction(0))
+    orbit = reference_orbit(zero, reference, depth + 1, threshold)
+    points = np.asarray(points, dtype=complex)
+    indices, values = iterate(points, points, orbit, 1, depth, threshold)
+    keep_state(state, indices, values, threshold)
+    if smooth:
+        return engine.smoothen(indices, values, depth, threshold)
+    return indices
+
+def julia(points, reference, constant, depth, threshold=2, smooth=False,
+          state=None):
+    """Calculate the colortable indices of POINTS in the julia set of CONSTANT.
+
+    POINTS are the differences to REFERENCE, a pair of fractions.
+    See engine.julia for the other arguments.
+
+    """
+    constant = tuple(fractions.Fraction(v) for v in constant)
+    orbit = reference_orbit(reference, constant, depth, threshold)
+    indices, values = iterate(points, 0, orbit, 0, depth, threshold)
+    keep_state(state, indices, values, threshold)
+    if smooth:
+        return engine.smoothen(indices, values, depth, threshold)
+    return indices
@@ -0,0 +1,51 @@
+"""Minimal PNG writer for 8 bit RGB images.
+
+Rows are compressed as they are written, so images can be written
+without holding all of their pixels in memory at once.
+
+"""
+
+import struct
+import zlib
+import numpy as np
+
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def chunk(tag, data):
+    "Return a PNG chunk of type TAG containing DATA."
+    return (struct.pack('>I', len(data)) + tag + data
+            + struct.pack('>I', zlib.crc32(tag + data)))
+
+class Writer():
+    "Writes an RGB image of WIDTH x HEIGHT pixels to FILENAME row by row."
+
+    def __init__(self, filename, width, height):
+        self.width = width
+        self.height = height
+        self._file = open(filename, 'wb')
+        self._compressor = zlib.compressobj()
+        self._file.write(SIGNATURE)
+        self._file.write(chunk(b'IHDR', struct.pack(
+            '>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+
+    def write_rows(self, rows):
+        "Append ROWS, an array of RGB colors indexed by [row, column]."
+        # every row starts with the filter type, 0 means no filter
+        raw = np.zeros((len(rows), self.width * 3 + 1), dtype=np.uint8)
+        raw[:,1:] = np.reshape(rows, (len(rows), -1))
+        data = self._compressor.compress(raw.tobytes())
+        if data:
+            self._file.write(chunk(b'IDAT', data))
+
+    def close(self):
+        "Finish the image and close the file."
+        self._file.write(chunk(b'IDAT', self._compressor.flush()))
+        self._file.write(chunk(b'IEND', b''))
+        self._file.close()
+
+def write(filename, pixels):
+    "Write an array of RGB PIXELS, indexed by [row, column], to FILENAME."
+    writer = Writer(filename, pixels.shape[1], pixels.shape[0])
+    writer.write_rows(pixels)
+    writer.close()
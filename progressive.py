@@ -0,0 +1,511 @@
+"""Coarse to fine rendering order.
+
+The canvas is calculated in levels. The first level calculates every
+pixel whose coordinates are multiples of the largest block size and
+paints it as a block of that size. Every following level halves the
+block size and only calculates the pixels on its grid that aren't
+known yet, either because a coarser level calculated them or because
+they were known before rendering started. After the level with a
+block size of one pixel, every pixel has been calculated exactly once.
+
+Along with the pixels, the state of their iteration is kept, so that
+raising the depth only continues the pixels that haven't escaped.
+
+Connected sets, like the mandelbrot set, can calculate the level of
+single pixels by rectangle subdivision instead, which fills uniform
+rectangles without calculating their inside. Kernels that estimate
+distances to the set fill the disk around pixels far from it.
+
+Symmetric fractals only calculate one of the mirror images of a pixel
+that are visible on the canvas, and copy it to the others after every
+level.
+
+"""
+
+from collections import namedtuple
+import engine
+import numpy as np
+import tiles
+import view
+
+
+# rectangles with sides of this size or less aren't subdivided further
+RECTANGLE_SIZE = 8
+# rectangle subdivision works on larger tiles, because every round of
+# subdivision costs about the same, no matter how many pixels it has
+SUBDIVISION_SCALE = 4
+# disks with a smaller radius in pixels aren't filled
+FILL_RADIUS = 2
+
+
+def block_sizes(width, height, coarsest=8):
+    """Return the block sizes of all levels, from coarse to fine.
+
+    The first level has about COARSEST blocks along the shorter side
+    of a WIDTH x HEIGHT canvas.
+
+    """
+    block_size = 1
+    while block_size * 2 * coarsest <= min(width, height):
+        block_size *= 2
+    sizes = []
+    while block_size >= 1:
+        sizes.append(block_size)
+        block_size //= 2
+    return sizes
+
+def tile_size(size, block_size, subdivide=False):
+    """Return the size of the tiles of the level of BLOCK_SIZE.
+
+    The tiles have SIZE x SIZE grid pixels, or SUBDIVISION_SCALE
+    times as many along each side if SUBDIVIDE is true and BLOCK_SIZE
+    is 1.
+
+    """
+    if subdivide and block_size == 1:
+        return size * SUBDIVISION_SCALE
+    return size * block_size
+
+def grid(tile, block_size):
+    """Return the columns and rows of TILE that lie on the grid of BLOCK_SIZE.
+
+    TILE must start on the grid.
+
+    """
+    return (np.arange(tile.x, tile.x + tile.width, block_size),
+            np.arange(tile.y, tile.y + tile.height, block_size))
+
+class Symmetry(namedtuple('Symmetry', ['copies'])):
+    """The pixels of a canvas that are copied from their mirror images.
+
+    COPIES holds triples of tiles.Tile target, tiles.Tile source and
+    flips: the pixels of target are copied from source, reversed
+    along the axes where flips is -1. See symmetry.
+
+    """
+
+    def mirrored(self, columns, rows):
+        "Check which pixels at COLUMNS and ROWS are copied from their mirror images."
+        mirrored = np.zeros(np.broadcast(columns, rows).shape, dtype=bool)
+        for target, source, flips in self.copies:
+            mirrored |= ((columns >= target.x)
+                         & (columns < target.x + target.width)
+                         & (rows >= target.y)
+                         & (rows < target.y + target.height))
+        return mirrored
+
+    def unmirrored(self, tile):
+        """Split TILE into rectangles that cover its pixels that aren't copied.
+
+        The tile is cut along the edges of the copied rectangles, so
+        each piece is either copied completely or not at all.
+
+        """
+        cuts = []
+        for start, length, edges in (
+                (tile.x, tile.width,
+                 [(target.x, target.width) for target, *_ in self.copies]),
+                (tile.y, tile.height,
+                 [(target.y, target.height) for target, *_ in self.copies])):
+            cuts.append(sorted({start, start + length} | {
+                cut for edge, size in edges for cut in (edge, edge + size)
+                if start < cut < start + length}))
+        return [tiles.Tile(left, top, right - left, bottom - top)
+                for left, right in zip(cuts[0], cuts[0][1:])
+                for top, bottom in zip(cuts[1], cuts[1][1:])
+                if not self.mirrored(left, top)]
+
+def symmetry(origin, mirrors, size):
+    """Find the pixels of a canvas of SIZE that are copied from their mirror images.
+
+    ORIGIN is the lattice index of the top left pixel of the canvas,
+    see view.View.origin. MIRRORS are pairs of factors, 1 or -1, for
+    the column and the row of a lattice pixel, that leave a fractal
+    unchanged. Together with the identity, they must be closed under
+    composition, like the reflections across the axes. Of the mirror
+    images of a pixel that lie on the canvas, the one with the
+    smallest lattice row, and then column, is calculated and the
+    others are copied from it. Returns a Symmetry, or None if no
+    pixel is copied.
+
+    """
+    # which mirror image is calculated only changes at the axes and
+    # where mirror images leave the canvas
+    cuts = []
+    for start, length in zip(origin, size):
+        cuts.append(sorted({0, length} | {
+            cut for cut in (-start, -start + 1,
+                            -2 * start - length + 1, -2 * start + 1)
+            if 0 < cut < length}))
+    copies = []
+    for left, right in zip(cuts[0], cuts[0][1:]):
+        for top, bottom in zip(cuts[1], cuts[1][1:]):
+            column, row = left + origin[0], top + origin[1]
+            best, flips = (row, column), (1, 1)
+            for column_factor, row_factor in mirrors:
+                image = (row_factor * row, column_factor * column)
+                if origin[0] <= image[1] < origin[0] + size[0] \
+                and origin[1] <= image[0] < origin[1] + size[1] \
+                and image < best:
+                    best, flips = image, (column_factor, row_factor)
+            if flips == (1, 1):
+                continue
+            source = tiles.Tile(
+                left if flips[0] == 1 else 1 - right - 2 * origin[0],
+                top if flips[1] == 1 else 1 - bottom - 2 * origin[1],
+                right - left, bottom - top)
+            copies.append((tiles.Tile(left, top, right - left, bottom - top),
+                           source, flips))
+    if not copies:
+        return None
+    return Symmetry(tuple(copies))
+
+def calculate(kernel, arguments, x, y, tile, block_size, buffers,
+              subdivide=False, fill=False, symmetry=None):
+    """Calculate the unknown pixels of TILE on the grid of BLOCK_SIZE.
+
+    The results of KERNEL are written into BUFFERS, continuing from
+    the state of their iteration. X and Y are the bounds of the view.
+    TILE must start on the grid. If SUBDIVIDE is true, a BLOCK_SIZE
+    of 1 is calculated by rectangle subdivision. If FILL is true,
+    KERNEL estimates distances to the set and the disks around the
+    calculated pixels are filled, see fill_disks. Pixels that are
+    mirrored by SYMMETRY aren't calculated, see mirror. Returns the
+    number of calculated pixels and of the iterations done for them.
+    Kernels that estimate distances don't keep the state of their
+    iteration, so their iterations aren't counted.
+
+    """
+    if subdivide and block_size == 1:
+        calculated, iterations = calculate_subdivided(
+            kernel, arguments, x, y, tile, buffers, symmetry)
+    else:
+        columns, rows = np.meshgrid(*grid(tile, block_size), indexing='ij')
+        columns, rows, iterations = calculate_pixels(
+            kernel, arguments, x, y, columns.ravel(), rows.ravel(), buffers,
+            symmetry)
+        calculated = len(columns)
+        if fill:
+            fill_disks(tile, columns, rows, buffers,
+                       (max(x) - min(x)) / buffers.width)
+    if fill:
+        return calculated, 0
+    return calculated, iterations
+
+def calculate_pixels(kernel, arguments, x, y, columns, rows, buffers,
+                     symmetry=None):
+    """Calculate the pixels at COLUMNS and ROWS, that aren't known yet.
+
+    See calculate for the other arguments. Returns the columns and
+    rows of the calculated pixels, and the number of iterations done
+    for them, see iterations_done.
+
+    """
+    new = ~buffers.known[columns, rows]
+    if symmetry != None:
+        new &= ~symmetry.mirrored(columns, rows)
+    if not new.any():
+        return columns[new], rows[new], 0
+    index = (columns[new], rows[new])
+    points = view.points_at(x, y, (buffers.width, buffers.height), *index)
+    state = (buffers.values[index], buffers.iterations[index],
+             buffers.escaped[index])
+    depth = arguments['depth']
+    done = iterations_done(state, depth)
+    buffers.counts[index] = kernel(points, state=state, **arguments)
+    buffers.values[index], buffers.iterations[index], \
+        buffers.escaped[index] = state
+    buffers.known[index] = True
+    iterations = iterations_done(state, depth, buffers.counts[index]) - done
+    return index + (int(iterations.sum()),)
+
+def iterations_done(state, depth, counts=None):
+    """Return how many iterations every lane of STATE has done.
+
+    See engine.resume for STATE. Escaped lanes have done one more
+    iteration than their colortable index. Lanes that are known to
+    never escape are counted up to DEPTH, because the iteration they
+    were found cycling at isn't kept. Lanes that the kernel didn't
+    keep, like the ones of perturbation that haven't escaped, are
+    counted by their colortable indices COUNTS, if given.
+
+    """
+    values, iterations, escaped = state
+    done = np.where(escaped, iterations.astype(np.int64) + 1,
+                    np.minimum(iterations, depth))
+    if counts is None:
+        return done
+    kept = escaped | (iterations != 0)
+    return np.where(kept, done, counts.astype(np.int64) + 1)
+
+def fill_disks(tile, columns, rows, buffers, pixel_size):
+    """Fill the unknown pixels of TILE around the pixels at COLUMNS and ROWS.
+
+    BUFFERS hold lower bounds of the distances to the set, so the
+    disk with that radius around a pixel lies outside of the set.
+    The distances of the pixels within a quarter of it differ little
+    from the one of the center, so they are filled with it. Disks
+    smaller than FILL_RADIUS pixels of PIXEL_SIZE aren't filled.
+
+    """
+    radii = buffers.counts[columns, rows] / pixel_size / 4
+    for column, row, radius in zip(columns, rows, radii):
+        if radius < FILL_RADIUS:
+            continue
+        reach = int(radius)
+        left = max(tile.x, column - reach)
+        top = max(tile.y, row - reach)
+        right = min(tile.x + tile.width, column + reach + 1)
+        bottom = min(tile.y + tile.height, row + reach + 1)
+        disk = ((np.arange(left, right) - column)[:, np.newaxis]**2
+                + (np.arange(top, bottom) - row)[np.newaxis, :]**2
+                <= radius**2)
+        known = buffers.known[left:right, top:bottom]
+        buffers.counts[left:right, top:bottom][disk & ~known] = \
+            buffers.counts[column, row]
+        known |= disk
+
+def calculate_subdivided(kernel, arguments, x, y, tile, buffers,
+                         symmetry=None):
+    """Calculate all unknown pixels of TILE by rectangle subdivision.
+
+    First the border of a rectangle is calculated. If all of its
+    pixels and all known pixels inside have the same value, the
+    inside is filled with it, because the set is connected, so only
+    details that touch neither the border nor a known pixel are
+    missed. Otherwise the rectangle is split into four, which share
+    their borders. Rectangles with a side of RECTANGLE_SIZE or less
+    are calculated completely. Each round of subdivision is
+    calculated with a single call of KERNEL. Only the pixels that
+    aren't mirrored by SYMMETRY are subdivided. See calculate for the
+    other arguments. Returns the number of calculated pixels and of
+    the iterations done for them.
+
+    """
+    calculated = 0
+    iterations = 0
+    rectangles = [tile] if symmetry == None else symmetry.unmirrored(tile)
+    while rectangles:
+        # mark the borders of large and the whole of small rectangles
+        wanted = np.zeros((tile.width, tile.height), dtype=bool)
+        large = []
+        for rectangle in rectangles:
+            area = wanted[rectangle.x - tile.x:
+                          rectangle.x - tile.x + rectangle.width,
+                          rectangle.y - tile.y:
+                          rectangle.y - tile.y + rectangle.height]
+            if min(rectangle.width, rectangle.height) <= RECTANGLE_SIZE:
+                area[:,:] = True
+                continue
+            area[[0, -1], :] = True
+            area[:, [0, -1]] = True
+            large.append(rectangle)
+        columns, rows = np.nonzero(wanted)
+        columns, rows, done = calculate_pixels(
+            kernel, arguments, x, y, columns + tile.x, rows + tile.y, buffers)
+        calculated += len(columns)
+        iterations += done
+        # fill uniform rectangles and split the others
+        rectangles = []
+        for rectangle in large:
+            counts = buffers.counts[rectangle.slices()]
+            known = buffers.known[rectangle.slices()]
+            if (counts[known] == counts[0, 0]).all():
+                counts[~known] = counts[0, 0]
+                known[:,:] = True
+                continue
+            half_width = rectangle.width // 2
+            half_height = rectangle.height // 2
+            for dx, width in ((0, half_width + 1),
+                              (half_width, rectangle.width - half_width)):
+                for dy, height in ((0, half_height + 1),
+                                   (half_height,
+                                    rectangle.height - half_height)):
+                    rectangles.append(tiles.Tile(
+                        rectangle.x + dx, rectangle.y + dy, width, height))
+    return calculated, iterations
+
+def blocks(buffers, tile, block_size):
+    """Return the colortable indices within TILE painted as blocks.
+
+    Every pixel of BUFFERS that is neither known nor estimated takes
+    the value of the grid pixel of BLOCK_SIZE at the top left corner
+    of its block. TILE must start on the grid.
+
+    """
+    grid_counts = buffers.counts[tile.x:tile.x + tile.width:block_size,
+                                 tile.y:tile.y + tile.height:block_size]
+    painted = np.repeat(np.repeat(grid_counts, block_size, axis=0),
+                        block_size, axis=1)[:tile.width, :tile.height]
+    shown = buffers.known[tile.slices()] | buffers.estimated[tile.slices()]
+    return np.where(shown, buffers.counts[tile.slices()], painted)
+
+def mirror(buffers, symmetry, block_size):
+    """Copy the pixels of BUFFERS to their mirror images under SYMMETRY.
+
+    Mirror images that aren't known yet take the pixels they are
+    copied from, as painted on the level of BLOCK_SIZE, as estimates,
+    unless those are known. Known pixels are copied along with the
+    state of their iteration, but orbits that haven't escaped start
+    over, because they aren't mirrored like the pixels. Returns which
+    pixels have changed.
+
+    """
+    changed = np.zeros((buffers.width, buffers.height), dtype=bool)
+    for target, source, flips in symmetry.copies:
+        # paint the grid aligned area around the source
+        area = tiles.Tile(source.x - source.x % block_size,
+                          source.y - source.y % block_size,
+                          source.width + source.x % block_size,
+                          source.height + source.y % block_size)
+        painted = blocks(buffers, area, block_size)[
+            source.x - area.x:, source.y - area.y:]
+        def mirrored(array):
+            return array[::flips[0], ::flips[1]]
+        unknown = ~buffers.known[target.slices()]
+        known = mirrored(buffers.known[source.slices()]) & unknown
+        buffers.counts[target.slices()][unknown] = mirrored(painted)[unknown]
+        buffers.estimated[target.slices()][unknown] = ~known[unknown]
+        buffers.known[target.slices()][known] = True
+        buffers.values[target.slices()][known] = \
+            mirrored(buffers.values[source.slices()])[known]
+        escaped = mirrored(buffers.escaped[source.slices()])[known]
+        iterations = mirrored(buffers.iterations[source.slices()])[known]
+        buffers.escaped[target.slices()][known] = escaped
+        buffers.iterations[target.slices()][known] = np.where(
+            escaped | (iterations == engine.NEVER), iterations, 0)
+        changed[target.slices()] = unknown
+    return changed
+
+def shift(array, dx, dy):
+    """Move the contents of ARRAY by DX columns and DY rows in place.
+
+    ARRAY is indexed by [column, row]. The exposed part keeps its old
+    contents.
+
+    """
+    width, height = array.shape[:2]
+    source = array[max(0, -dx):width - max(0, dx),
+                   max(0, -dy):height - max(0, dy)].copy()
+    array[max(0, dx):width - max(0, -dx),
+          max(0, dy):height - max(0, -dy)] = source
+
+def resample_axis(origin, pixel_size, new_origin, new_pixel_size, length):
+    """Find the old positions of LENGTH pixels on a new lattice axis.
+
+    Returns the index of the old pixel each new pixel falls into, and
+    whether it lies exactly on that old pixel.
+
+    """
+    positions = ((new_origin + np.arange(length)) * new_pixel_size
+                 / pixel_size - origin)
+    indices = np.floor(positions).astype(int)
+    return indices, positions == indices
+
+class Buffers():
+    """The colortable indices of all pixels of a canvas and which are known.
+
+    All members named in FIELDS are arrays indexed by [column, row].
+    Besides the colortable indices in counts, they hold the state of
+    the iteration of every pixel, see engine.resume. Pixels that
+    haven't been iterated have no iterations. ARRAYS can provide
+    some of them, for example in shared memory. Estimated pixels
+    hold a placeholder value, that is shown until they are
+    calculated. The contents member describes what the buffers hold,
+    so that the next calculation can tell whether it may reuse them.
+
+    """
+
+    FIELDS = (('counts', np.float32), ('known', bool), ('values', complex),
+              ('iterations', np.int32), ('escaped', bool))
+
+    def __init__(self, width, height, arrays=None):
+        self.width = width
+        self.height = height
+        for name, dtype in self.FIELDS:
+            if arrays != None and name in arrays:
+                setattr(self, name, arrays[name])
+            else:
+                setattr(self, name, np.zeros((width, height), dtype=dtype))
+        self.estimated = np.zeros((width, height), dtype=bool)
+        self.contents = None
+
+    def arrays(self):
+        "Return all arrays of the buffers."
+        return [getattr(self, name) for name, dtype in self.FIELDS] \
+            + [self.estimated]
+
+    def forget(self, index=np.s_[:, :]):
+        "Forget the pixels at INDEX and the state of their iteration."
+        self.known[index] = False
+        self.estimated[index] = False
+        self.iterations[index] = 0
+        self.escaped[index] = False
+
+    def clear(self):
+        "Forget all pixels."
+        self.forget()
+        self.contents = None
+
+    def shift(self, dx, dy):
+        "Move all pixels by DX columns and DY rows, forgetting exposed ones."
+        if abs(dx) >= self.width or abs(dy) >= self.height:
+            self.forget()
+            return
+        for array in self.arrays():
+            shift(array, dx, dy)
+        # forget the exposed strips
+        if dx > 0:
+            self.forget(np.s_[:dx, :])
+        elif dx < 0:
+            self.forget(np.s_[dx:, :])
+        if dy > 0:
+            self.forget(np.s_[:, :dy])
+        elif dy < 0:
+            self.forget(np.s_[:, dy:])
+
+    def resample(self, pixel_size, origin, new_pixel_size, new_origin):
+        """Move all pixels to a lattice with another pixel size.
+
+        The pixels currently lie on the lattice of PIXEL_SIZE at
+        ORIGIN and are moved to the lattice of NEW_PIXEL_SIZE at
+        NEW_ORIGIN. New pixels that lie exactly on a known old pixel
+        stay known, together with their state. The others take the
+        value of the old pixel they fall into as an estimate, if that
+        one was known or estimated.
+
+        """
+        columns, exact_columns = resample_axis(
+            origin[0], pixel_size[0], new_origin[0], new_pixel_size[0],
+            self.width)
+        rows, exact_rows = resample_axis(
+            origin[1], pixel_size[1], new_origin[1], new_pixel_size[1],
+            self.height)
+        inside = (((columns >= 0) & (columns < self.width))[:, np.newaxis]
+                  & ((rows >= 0) & (rows < self.height))[np.newaxis, :])
+        exact = exact_columns[:, np.newaxis] & exact_rows[np.newaxis, :]
+        index = (np.clip(columns, 0, self.width - 1)[:, np.newaxis],
+                 np.clip(rows, 0, self.height - 1)[np.newaxis, :])
+        known = self.known[index] & inside
+        estimated = (known | self.estimated[index]) & inside
+        for array in self.arrays():
+            array[:,:] = array[index]
+        self.counts[~estimated] = 0
+        kept = known & exact
+        self.forget(~kept)
+        self.estimated[:,:] = estimated & ~kept
+
+    def change_depth(self, depth, new_depth):
+        """Adapt the pixels calculated with DEPTH to NEW_DEPTH.
+
+        Lowering the depth clamps the colortable indices. Raising it
+        turns the pixels at the old maximum into estimates, so that
+        they are calculated again, continuing from their state.
+
+        """
+        if new_depth < depth:
+            np.minimum(self.counts, new_depth - 1, out=self.counts)
+        elif new_depth > depth:
+            maximum = self.known & (self.counts >= depth - 1)
+            self.known[maximum] = False
+            self.estimated |= maximum
@@ -0,0 +1,98 @@
+"""Instrumentation of rendering.
+
+A RenderStats collects where the time of rendering a fractal goes:
+calculating, drawing the results onto the canvas, checking for events
+and updating the window. It also counts the calculated pixels and
+their iterations and times every level of the progressive rendering order. Fractals whose
+stats member is set to a RenderStats fill it while they render, see
+fractal.Fractal. Without one, nothing is measured.
+
+"""
+
+import contextlib
+import time
+
+
+class RenderStats():
+    """Collects the timings and counts of one render at a time.
+
+    The seconds member holds the time of every phase in PHASES. The
+    calculated member counts the pixels that were calculated, or the
+    points that were drawn by the chaos game. The iterations member
+    counts the iterations done for them. The levels member holds
+    the block size, the calculated pixels and the wall time of every
+    finished level. If LOG_INTERVAL is set, tick prints a summary at
+    most once per LOG_INTERVAL seconds.
+
+    """
+
+    PHASES = ('calculate', 'draw', 'events', 'update')
+
+    def __init__(self, log_interval=None):
+        self.log_interval = log_interval
+        self.start()
+
+    def start(self):
+        "Start collecting for a new render."
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.calculated = 0
+        self.iterations = 0
+        self.levels = []
+        self._logged = (self.started, None)
+
+    @contextlib.contextmanager
+    def timed(self, phase):
+        "Add the time spent in the with block to PHASE."
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] += time.perf_counter() - start
+
+    def add_level(self, block_size, calculated, seconds):
+        "Record a finished level of BLOCK_SIZE."
+        self.levels.append((block_size, calculated, seconds))
+
+    def readout(self):
+        "Return the time of every phase and the calculation rates in one line."
+        phases = ", ".join("{} {:.2f} s".format(phase, self.seconds[phase])
+                           for phase in self.PHASES)
+        seconds = max(self.seconds['calculate'], 1e-9)
+        return "{}, {} px ({:.0f} px/s), {} it ({:.0f} it/s)".format(
+            phases, self.calculated, self.calculated / seconds,
+            self.iterations, self.iterations / seconds)
+
+    def summary(self):
+        "Return the readout with the elapsed time and the last level."
+        line = "{:.2f} s: {}".format(time.perf_counter() - self.started,
+                                     self.readout())
+        if self.levels:
+            line += ", level {} took {:.2f} s".format(self.levels[-1][0],
+                                                     self.levels[-1][2])
+        return line
+
+    def tick(self):
+        """Print the summary if the log interval has passed.
+
+        Nothing is printed while the stats don't change, so idle
+        fractals don't log.
+
+        """
+        if self.log_interval == None \
+        or time.perf_counter() - self._logged[0] < self.log_interval \
+        or self._state() == self._logged[1]:
+            return
+        self.log()
+
+    def log(self):
+        "Print the summary, if a log interval is set."
+        if self.log_interval == None:
+            return
+        print(self.summary())
+        self._logged = (time.perf_counter(), self._state())
+
+    def _state(self):
+        "Return what changes while rendering."
+        return (self.calculated, self.iterations, self.seconds['calculate'],
+                self.seconds['draw'])
@@ -0,0 +1,138 @@
+"""Animations of julia sets along a path of constants.
+
+Every frame is the julia set of one constant of the path. The frames
+are independent of each other, so they are rendered on a pool of
+worker processes, a few frames ahead of the one that is delivered
+next. sweep is a generator, which yields the frames in order, and the
+command line writes them as numbered images.
+
+Example:
+
+    python sweep.py frames/frame{:04d}.png --circle 0 0 0.7885 \\
+        --frames 360 --depth 500
+
+"""
+
+import argparse
+import batch
+import canvas
+import collections
+import concurrent.futures
+import fractions
+import math
+import os
+import png
+
+
+def line(start, end, frames):
+    "Return FRAMES constants on the line from START to END, both included."
+    if frames == 1:
+        return [start]
+    return [(start[0] + (end[0] - start[0]) * i / (frames - 1),
+             start[1] + (end[1] - start[1]) * i / (frames - 1))
+            for i in range(frames)]
+
+def circle(middle, radius, frames):
+    """Return FRAMES constants on the circle of RADIUS around MIDDLE.
+
+    The constants go around once, starting right of the middle, so
+    the animation can be looped.
+
+    """
+    return [(middle[0] + radius * math.cos(2 * math.pi * i / frames),
+             middle[1] + radius * math.sin(2 * math.pi * i / frames))
+            for i in range(frames)]
+
+def render_frame(fractal_arguments, x, y, size, constant):
+    """Render the julia set of CONSTANT into an image of SIZE.
+
+    This function runs in a worker process. X and Y are the bounds
+    of the image, FRACTAL_ARGUMENTS are passed to batch.make_fractal.
+    Returns an array of RGB colors indexed by [row, column].
+
+    """
+    fractal = batch.make_fractal(*fractal_arguments)
+    fractal.constant = tuple(constant)
+    fractal.view.canvas = canvas.HeadlessCanvas(*size)
+    fractal.view.set_bounds(x, y)
+    fractal.paused = False
+    fractal.render()
+    return fractal.view.canvas.pixels.transpose(1, 0, 2)
+
+def sweep(fractal_arguments, x, y, size, constants, workers=None):
+    """Yield the images of the julia sets of CONSTANTS in order.
+
+    The images have SIZE and the bounds X and Y, pairs of fractions.
+    FRACTAL_ARGUMENTS are passed to batch.make_fractal. They are
+    rendered on WORKERS processes, which stay at most two frames per
+    worker ahead, so that undelivered frames don't pile up.
+
+    """
+    ahead = 2 * (workers or os.cpu_count())
+    pool = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        pending = collections.deque()
+        for constant in constants:
+            pending.append(pool.submit(render_frame, fractal_arguments,
+                                       x, y, size, constant))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # when closed early, don't wait for the frames being rendered
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render julia sets along a path of constants.")
+    parser.add_argument('pattern',
+                        help="file name of the frames, formatted with "
+                        "their number, like frames/frame{:04d}.png")
+    path = parser.add_mutually_exclusive_group(required=True)
+    path.add_argument('--line', type=float, nargs=4,
+                      metavar=('REAL', 'IMAG', 'REAL', 'IMAG'),
+                      help="constants from the first to the second point")
+    path.add_argument('--circle', type=float, nargs=3,
+                      metavar=('REAL', 'IMAG', 'RADIUS'),
+                      help="constants on a circle")
+    path.add_argument('--constants', type=float, nargs='+',
+                      metavar='REAL IMAG', help="list of constants")
+    parser.add_argument('--frames', type=int, default=100,
+                        help="number of frames of a line or circle")
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--x', type=fractions.Fraction, nargs=2,
+                        metavar=('MIN', 'MAX'))
+    parser.add_argument('--y', type=fractions.Fraction, nargs=2,
+                        metavar=('MIN', 'MAX'))
+    parser.add_argument('--depth', type=int, default=100)
+    parser.add_argument('--gray', action='store_true')
+    parser.add_argument('--smooth', action='store_true')
+    parser.add_argument('--subdivide', action='store_true')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    if args.line != None:
+        constants = line(args.line[:2], args.line[2:], args.frames)
+    elif args.circle != None:
+        constants = circle(args.circle[:2], args.circle[2], args.frames)
+    elif len(args.constants) % 2 == 0:
+        constants = list(zip(args.constants[::2], args.constants[1::2]))
+    else:
+        parser.error("--constants takes pairs of real and imaginary parts")
+    fractal_arguments = ('julia', max(2, args.depth), not args.gray,
+                         args.smooth, args.subdivide, False,
+                         tuple(constants[0]))
+    x, y = batch.default_bounds(fractal_arguments, args.x, args.y, args.size)
+    directory = os.path.dirname(args.pattern)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    frames = sweep(fractal_arguments, x, y, tuple(args.size), constants,
+                   args.workers)
+    for i, image in enumerate(frames):
+        png.write(args.pattern.format(i), image)
+        print("{}/{} frames".format(i + 1, len(constants)))
+
+if __name__ == '__main__':
+    main()
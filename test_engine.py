@@ -0,0 +1,29 @@
+import engine
+import numpy as np
+import unittest
+
+
+class LogisticMapTest(unittest.TestCase):
+
+    def test_chaotic_columns_are_not_cut_off(self):
+        # these rates had orbits that came back close by chance
+        rates = 3.5 + np.arange(800) * 0.5 / 800
+        height = 600
+        exact = engine.logistic_map(rates, 600, (0, 1), height, 100)
+        detected = engine.logistic_map(rates, 600, (0, 1), height, 100,
+                                       tolerance=1e-3 / height)
+        chaotic = (exact > 0).sum(axis=1) > 100
+        self.assertTrue(chaotic.any())
+        np.testing.assert_allclose(detected[chaotic], exact[chaotic])
+
+    def test_cycles_are_counted_for_the_rest_of_the_orbit(self):
+        rates = [3.2]
+        exact = engine.logistic_map(rates, 1000, (0, 1), 100, 100)
+        detected = engine.logistic_map(rates, 1000, (0, 1), 100, 100,
+                                       tolerance=1e-6)
+        np.testing.assert_allclose(detected.sum(), 1000)
+        np.testing.assert_allclose(detected, exact, atol=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import canvas
+import mandelbrot
+import numpy as np
+import stats
+import unittest
+
+
+def render(depth=100, x=(-2.1,0.9), y=(-1.1,1.1), fractal=None):
+    "Calculate a mandelbrot set of DEPTH in X and Y, or FRACTAL, to the end."
+    if fractal == None:
+        fractal = mandelbrot.Mandelbrot(canvas.HeadlessCanvas(96, 72),
+                                        depth=depth)
+        fractal.view.set_bounds(x, y)
+    for draw in fractal.calculate():
+        pass
+    return fractal
+
+
+class BuffersTest(unittest.TestCase):
+
+    def assert_same_pixels(self, fractal, fresh):
+        self.assertTrue(fractal.buffers.known.all())
+        np.testing.assert_array_equal(fractal.buffers.counts,
+                                      fresh.buffers.counts)
+
+    def test_raising_the_depth_continues_the_iteration(self):
+        fractal = render(depth=100)
+        fractal.set_depth(150)
+        render(fractal=fractal)
+        self.assert_same_pixels(fractal, render(depth=150))
+
+    def test_lowering_the_depth_clamps_the_counts(self):
+        fractal = render(depth=100)
+        fractal.set_depth(50)
+        render(fractal=fractal)
+        self.assert_same_pixels(fractal, render(depth=50))
+
+    def test_panning_reuses_the_overlapping_pixels(self):
+        fractal = render()
+        size_x, size_y = fractal.view.pixel_size()
+        x = tuple(v + 3 * size_x for v in fractal.view.x)
+        y = tuple(v - 2 * size_y for v in fractal.view.y)
+        fractal.view.set_bounds(x, y)
+        fractal.stats = stats.RenderStats()
+        render(fractal=fractal)
+        # only the uncovered strips are calculated, or mirrored
+        width, height = fractal.buffers.width, fractal.buffers.height
+        self.assertLessEqual(fractal.stats.calculated,
+                             width * height - (width - 3) * (height - 2))
+        self.assert_same_pixels(fractal, render(x=x, y=y))
+
+    def test_zooming_only_keeps_exact_pixels_known(self):
+        fractal = render()
+        buffers = fractal.buffers
+        parameters, pixel_size, origin, depth = buffers.contents
+        fractal.view.zoom(factor=2)
+        parameters, new_pixel_size, new_origin, depth = fractal.contents()
+        buffers.resample(pixel_size, origin, new_pixel_size, new_origin)
+        self.assertTrue(buffers.estimated.any())
+        self.assertFalse((buffers.known & buffers.estimated).any())
+        fresh = render(x=fractal.view.x, y=fractal.view.y)
+        np.testing.assert_array_equal(buffers.counts[buffers.known],
+                                      fresh.buffers.counts[buffers.known])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tiled rendering on a pool of worker processes.
+
+The canvas is split into tiles, which are calculated by worker
+processes, one level of the progressive rendering order at a time.
+The workers write the colortable indices of their tile and the state
+of their iteration into buffers in shared memory, so only the tile
+coordinates travel between the processes. The colortable indices are
+floats, so that they can take smooth iteration counts as well.
+
+"""
+
+from collections import namedtuple
+import concurrent.futures
+from multiprocessing import shared_memory
+import numpy as np
+import progressive
+
+
+TILE_SIZE = 64
+
+class Tile(namedtuple('Tile', ['x', 'y', 'width', 'height'])):
+    "A rectangular area of the canvas, in pixels."
+
+    def slices(self):
+        "Return the index of this tile in a [column, row] array."
+        return (slice(self.x, self.x + self.width),
+                slice(self.y, self.y + self.height))
+
+def split(width, height, size=64):
+    "Split a WIDTH x HEIGHT canvas into tiles of at most SIZE x SIZE pixels."
+    for y in range(0, height, size):
+        for x in range(0, width, size):
+            yield Tile(x, y, min(size, width - x), min(size, height - y))
+
+def shared_buffers(size, memory):
+    """Return progressive.Buffers of SIZE in the shared MEMORY.
+
+    MEMORY holds a SharedMemory for every field of the buffers.
+
+    """
+    return progressive.Buffers(*size, arrays={
+        name: np.ndarray(size, dtype=dtype, buffer=block.buf)
+        for (name, dtype), block in zip(progressive.Buffers.FIELDS, memory)})
+
+def render_tile(kernel, arguments, x, y, size, tile, block_size, subdivide,
+                fill, symmetry, names):
+    """Calculate the unknown pixels of TILE on the grid of BLOCK_SIZE.
+
+    This function runs in a worker process. It writes the results
+    of KERNEL into the buffers of SIZE in the shared memory called
+    NAMES. See progressive.calculate for the other arguments.
+    Returns the tile and the numbers of calculated pixels and of the
+    iterations done for them.
+
+    """
+    memory = [shared_memory.SharedMemory(name=name) for name in names]
+    buffers = shared_buffers(size, memory)
+    calculated, iterations = progressive.calculate(
+        kernel, arguments, x, y, tile, block_size, buffers, subdivide, fill,
+        symmetry)
+    del buffers
+    for block in memory:
+        block.close()
+    return tile, calculated, iterations
+
+class TileRenderer():
+    """Renders fractals tile by tile on a pool of worker processes.
+
+    The workers calculate into the buffers member, a
+    progressive.Buffers in shared memory. Tiles have TILE_SIZE x
+    TILE_SIZE grid pixels, so coarse levels are split into fewer
+    tiles. If WIDTH or HEIGHT changes, create a new TileRenderer.
+
+    """
+
+    def __init__(self, width, height, workers=None, tile_size=TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self._pool = concurrent.futures.ProcessPoolExecutor(workers)
+        self._memory = [
+            shared_memory.SharedMemory(
+                create=True, size=width * height * np.dtype(dtype).itemsize)
+            for name, dtype in progressive.Buffers.FIELDS]
+        self.buffers = shared_buffers((width, height), self._memory)
+        self._futures = []
+
+    def submit(self, kernel, arguments, view, block_size=1, subdivide=False,
+               fill=False, symmetry=None):
+        """Start rendering one level of VIEW with KERNEL and its ARGUMENTS.
+
+        KERNEL must be a module level function, so that it can be
+        sent to the worker processes. See progressive.calculate for
+        SUBDIVIDE, FILL and SYMMETRY. Tiles of a previous submission,
+        that aren't finished yet, are cancelled.
+
+        """
+        self.cancel()
+        self._futures = [
+            self._pool.submit(render_tile, kernel, arguments,
+                              view.x, view.y, (self.width, self.height),
+                              tile, block_size, subdivide, fill, symmetry,
+                              [block.name for block in self._memory])
+            for tile in split(self.width, self.height, progressive.tile_size(
+                self.tile_size, block_size, subdivide))]
+
+    def finished(self):
+        """Yield the tiles of the current submission as they are finished.
+
+        Together with each tile, the numbers of pixels that have been
+        calculated in it and of the iterations done for them are
+        yielded.
+
+        """
+        for future in concurrent.futures.as_completed(self._futures):
+            if not future.cancelled():
+                yield future.result()
+
+    def cancel(self):
+        """Cancel all tiles that are not finished yet.
+
+        Tiles that are already being calculated can't be interrupted,
+        so wait for them to prevent them from overwriting the results
+        of the next submission.
+
+        """
+        for future in self._futures:
+            future.cancel()
+        concurrent.futures.wait(self._futures)
+        self._futures = []
+
+    def close(self):
+        "Stop the worker processes and free the shared memory."
+        self.cancel()
+        self._pool.shutdown()
+        del self.buffers
+        for block in self._memory:
+            block.close()
+            block.unlink()
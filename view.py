@@ -1,6 +1,12 @@
 from enum import Enum
+import fractions
+import math
+import numpy as np
 
 
+# below this pixel size, floats can't resolve the pixels of a view
+PRECISION_LIMIT = 1e-12
+
 class Direction(Enum):
     UP = 0
     DOWN = 1
@@ -8,12 +14,21 @@ class Direction(Enum):
     RIGHT = 3
 
 class View:
-    "Represents the view and manages it's coordinates."
+    """Represents the view and manages it's coordinates.
+
+    If DEEP is true, the view can zoom in beyond the precision of
+    floats. Its coordinates are then relative to the reference
+    member, a point of two fractions, which follows the view once it
+    is deep enough.
+
+    """
 
-    def __init__(self, canvas, x=(-2,2), y=(-2,2)):
+    def __init__(self, canvas, x=(-2,2), y=(-2,2), deep=False):
         self.canvas = canvas
         self.x = x # corresponds to width
         self.y = y # corresponds to height
+        self.deep = deep
+        self.reference = (fractions.Fraction(0), fractions.Fraction(0))
 
     def __str__(self):
         return "( x:({}, {}), y:({}, {}) )".format(
@@ -58,6 +73,7 @@ class View:
               .format(factor, new_size_x, new_size_y))
         self.x = (point[0] - new_size_x / 2, point[0] + new_size_x / 2)
         self.y = (point[1] - new_size_y / 2, point[1] + new_size_y / 2)
+        self.rebase()
 
     def move(self, direction=None, factor=0.25):
         """Move view a specific distance into one of four directions.
@@ -80,6 +96,84 @@ class View:
         elif direction == Direction.RIGHT:
             self.x = (min(self.x) + size_x * factor,
                       max(self.x) + size_x * factor)
+        self.rebase()
+
+    def is_deep(self):
+        "Check whether the pixels are too small to be resolved by floats."
+        return self.deep and self.size_x() / self.canvas.width < PRECISION_LIMIT
+
+    def rebase(self):
+        """Move the reference point, so that floats can resolve the view.
+
+        Deep views move the reference to their middle, once they got
+        far away from it, compared to their size. Other views move it
+        back to zero.
+
+        """
+        if self.is_deep():
+            middle = (self.middle_x(), self.middle_y())
+            if any(self.reference) \
+            and max(abs(middle[0]), abs(middle[1])) < self.size_x() * 2**16:
+                return
+            self.move_reference(
+                (self.reference[0] + fractions.Fraction(middle[0]),
+                 self.reference[1] + fractions.Fraction(middle[1])))
+        elif any(self.reference):
+            self.move_reference((fractions.Fraction(0), fractions.Fraction(0)))
+
+    def move_reference(self, reference):
+        "Make the coordinates relative to REFERENCE without moving the view."
+        dx = self.reference[0] - reference[0]
+        dy = self.reference[1] - reference[1]
+        self.x = tuple(float(fractions.Fraction(v) + dx) for v in self.x)
+        self.y = tuple(float(fractions.Fraction(v) + dy) for v in self.y)
+        self.reference = reference
+
+    def set_bounds(self, x, y):
+        """Show the bounds X and Y, pairs of fractions.
+
+        Deep views take their middle as reference point, so that the
+        bounds don't need to be resolved by floats.
+
+        """
+        self.reference = ((x[0] + x[1]) / 2, (y[0] + y[1]) / 2)
+        self.x = tuple(float(v - self.reference[0]) for v in x)
+        self.y = tuple(float(v - self.reference[1]) for v in y)
+        if not self.is_deep():
+            self.move_reference((fractions.Fraction(0), fractions.Fraction(0)))
+
+    def pixel_size(self):
+        """Width and height of one pixel in the view.
+
+        Both are rounded to 30 significant bits, so that views that
+        only differ by rounding errors share the same pixel size.
+
+        """
+        return (quantize(self.size_x() / self.canvas.width),
+                quantize(self.size_y() / self.canvas.height))
+
+    def origin(self):
+        """Index of the top left pixel on the lattice of all pixels.
+
+        Pixel (i, j) of the lattice lies at the point
+        (i * pixel width, -j * pixel height).
+
+        """
+        size_x, size_y = self.pixel_size()
+        return (round(min(self.x) / size_x), round(-max(self.y) / size_y))
+
+    def snap(self):
+        """Align the view to the lattice of pixels.
+
+        Afterwards, any two views with the same pixel size calculate
+        the same points for the same lattice pixels, so their results
+        can be shared. The view moves by less than one pixel.
+
+        """
+        size_x, size_y = self.pixel_size()
+        column, row = self.origin()
+        self.x = (column * size_x, (column + self.canvas.width) * size_x)
+        self.y = (-(row + self.canvas.height) * size_y, -row * size_y)
 
     def point_to_pixel(self, point):
         """Transforms a point within the coordinate system represented by this object into pixel coordinates.
@@ -95,7 +189,59 @@ class View:
         return (distance_to_border_left / self.size_x() * self.canvas.width,
                 distance_to_border_top / self.size_y() * self.canvas.height)
 
+    def pixel_to_point(self, pixel):
+        "Transforms pixel coordinates into a point within the coordinate system represented by this object."
+        return (min(self.x) + pixel[0] / self.canvas.width * self.size_x(),
+                max(self.y) - pixel[1] / self.canvas.height * self.size_y())
+
+    def pixel_points(self, pos=(0,0), shape=None):
+        "Return the points at the pixels of an area of the canvas as complex numbers."
+        return pixel_points(self.x, self.y,
+                            (self.canvas.width, self.canvas.height),
+                            pos, shape)
+
     def square(self, point, color, size=1):
         "Color a square at POINT with a size of SIZE x SIZE pixel."
         pos = self.point_to_pixel(point)
         self.canvas.square(pos, size, color)
+
+def pixel_points(x, y, size, pos=(0,0), shape=None):
+    """Return the points at the pixels of an area of a canvas as complex numbers.
+
+    X and Y are the bounds of the view, SIZE is the width and height
+    of the canvas. The area starts at the pixel POS and has a width
+    and height of SHAPE, which defaults to the rest of the canvas.
+    The returned array is indexed by [column, row], like the arrays
+    of pygame.surfarray.
+
+    """
+    if shape == None:
+        shape = (size[0] - pos[0], size[1] - pos[1])
+    return grid_points(x, y, size,
+                       pos[0] + np.arange(shape[0]),
+                       pos[1] + np.arange(shape[1]))
+
+def grid_points(x, y, size, columns, rows):
+    """Return the points at the crossings of COLUMNS and ROWS as complex numbers.
+
+    X and Y are the bounds of the view, SIZE is the width and height
+    of the canvas. The returned array is indexed by [column, row].
+
+    """
+    return points_at(x, y, size, columns[:, np.newaxis], rows[np.newaxis, :])
+
+def points_at(x, y, size, columns, rows):
+    """Return the points at the pixels in COLUMNS and ROWS as complex numbers.
+
+    X and Y are the bounds of the view, SIZE is the width and height
+    of the canvas. COLUMNS and ROWS are broadcast against each other.
+
+    """
+    real = min(x) + columns / size[0] * (max(x) - min(x))
+    imag = max(y) - rows / size[1] * (max(y) - min(y))
+    return real + 1j * imag
+
+def quantize(value, bits=30):
+    "Round VALUE to BITS significant bits."
+    mantissa, exponent = math.frexp(value)
+    return math.ldexp(round(mantissa * 2**bits) / 2**bits, exponent)
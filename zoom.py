@@ -0,0 +1,175 @@
+"""Zoom animations from an exponential strip.
+
+Neighbouring frames of a zoom show almost the same points, so instead
+of calculating every frame, the fractal is calculated once on an
+exponential strip around the zoom target: row k of the strip is the
+circle of radius exp(k * step) around the target and its columns are
+the angles on that circle, spaced by the same step. Such a strip has
+the resolution of a frame at every zoom level, and each frame is
+resampled from its rows. Every doubling of the zoom costs about as
+much as two or three frames, however many frames it is spread over.
+
+Example:
+
+    python zoom.py mandelbrot frames/frame{:04d}.png --frames 1000 \\
+        --factor 1.02 --target -0.743643887 0.131825904 --depth 3000
+
+"""
+
+import argparse
+import batch
+import canvas
+import fractions
+import math
+import numpy as np
+import os
+import png
+
+
+# rows of the strip that are calculated at once
+BAND_HEIGHT = 32
+
+def strip_columns(size):
+    """Return the number of angles of the strip for frames of SIZE.
+
+    The corners of the frames are the farthest from the target, so
+    the angles are spaced by at most one pixel there.
+
+    """
+    return math.ceil(math.pi * math.hypot(*size))
+
+def render_strip(fractal, target, inner_radius, rows, columns):
+    """Calculate the colors of FRACTAL on the exponential strip around TARGET.
+
+    TARGET is a pair of fractions. The strip has ROWS and COLUMNS
+    and starts at INNER_RADIUS. Returns an array of RGB colors
+    indexed by [row, column].
+
+    """
+    step = 2 * math.pi / columns
+    angles = np.exp(1j * step * np.arange(columns))
+    strip = np.zeros((rows, columns, 3), dtype=np.uint8)
+    fractal.view.canvas = canvas.HeadlessCanvas(1, 1)
+    for row in range(0, rows, BAND_HEIGHT):
+        radii = inner_radius * np.exp(step * np.arange(
+            row, min(rows, row + BAND_HEIGHT)))
+        # A view of one pixel of the size of the finest sample of the
+        # band decides whether it is calculated by perturbation,
+        # around the target as reference.
+        spacing = fractions.Fraction(radii[0] * step) / 2
+        fractal.view.set_bounds(
+            (target[0] - spacing, target[0] + spacing),
+            (target[1] - spacing, target[1] + spacing))
+        kernel, arguments = fractal.kernel()
+        reference = fractal.view.reference
+        middle = complex(float(target[0] - reference[0]),
+                         float(target[1] - reference[1]))
+        points = middle + radii[:, np.newaxis] * angles[np.newaxis, :]
+        strip[row:row + len(radii)] = fractal.colorize(
+            kernel(points, **arguments))
+    return strip
+
+def frame_coordinates(size, columns):
+    """Return where the pixels of frames of SIZE lie on the strip.
+
+    Returns the logarithm of the distance of every pixel to the
+    middle of the frame, in pixels, and the column of its angle, both
+    indexed by [row, column].
+
+    """
+    x = np.arange(size[0]) - size[0] / 2
+    y = size[1] / 2 - np.arange(size[1])
+    offsets = x[np.newaxis, :] + 1j * y[:, np.newaxis]
+    with np.errstate(divide='ignore'):
+        distances = np.log(abs(offsets))
+    angles = np.angle(offsets) % (2 * math.pi)
+    return distances, angles / (2 * math.pi) * columns
+
+def sample(strip, rows, columns):
+    """Interpolate the colors of STRIP at fractional ROWS and COLUMNS.
+
+    Rows are clamped to the strip, columns wrap around.
+
+    """
+    rows = np.clip(rows, 0, len(strip) - 1)
+    top = np.minimum(rows.astype(int), len(strip) - 2)
+    left = columns.astype(int) % strip.shape[1]
+    right = (left + 1) % strip.shape[1]
+    down = (rows - top)[..., np.newaxis]
+    across = (columns - np.floor(columns))[..., np.newaxis]
+    colors = (1 - down) * ((1 - across) * strip[top, left]
+                           + across * strip[top, right]) \
+        + down * ((1 - across) * strip[top + 1, left]
+                  + across * strip[top + 1, right])
+    return colors.astype(np.uint8)
+
+def render(fractal, target, width, factor, frames, size, pattern):
+    """Render FRAMES frames of a zoom of FRACTAL into TARGET.
+
+    TARGET is a pair of fractions in the middle of all frames. The
+    first frame is WIDTH wide, every next one is zoomed in by FACTOR.
+    The frames have SIZE and are written to PATTERN formatted with
+    their number.
+
+    """
+    columns = strip_columns(size)
+    step = 2 * math.pi / columns
+    pixel_size = width / size[0]
+    # the last frame needs half a pixel around its middle
+    inner_radius = pixel_size / factor**(frames - 1) / 2
+    outer_radius = pixel_size * math.hypot(*size) / 2
+    rows = math.ceil(math.log(outer_radius / inner_radius) / step) + 2
+    print("Calculating a strip of {} x {} points".format(columns, rows))
+    strip = render_strip(fractal, target, inner_radius, rows, columns)
+
+    distances, angles = frame_coordinates(size, columns)
+    for frame in range(frames):
+        radii = math.log(pixel_size / factor**frame / inner_radius) + distances
+        png.write(pattern.format(frame), sample(strip, radii / step, angles))
+        print("{}/{} frames".format(frame + 1, frames))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the frames of a zoom into a fractal.")
+    parser.add_argument('fractal', choices=batch.FRACTALS)
+    parser.add_argument('pattern',
+                        help="file name of the frames, formatted with "
+                        "their number, like frames/frame{:04d}.png")
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--target', type=fractions.Fraction, nargs=2,
+                        metavar=('REAL', 'IMAG'),
+                        help="point to zoom into, defaults to the middle "
+                        "of the default view")
+    parser.add_argument('--width', type=float,
+                        help="width of the first frame, defaults to the "
+                        "width of the default view")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--factor', type=float, default=1.05,
+                        help="zoom from one frame to the next")
+    parser.add_argument('--depth', type=int, default=100)
+    parser.add_argument('--constant', type=float, nargs=2,
+                        default=(0.7, 0.3), metavar=('REAL', 'IMAG'),
+                        help="constant of the julia set")
+    parser.add_argument('--gray', action='store_true')
+    parser.add_argument('--smooth', action='store_true')
+    args = parser.parse_args()
+
+    fractal = batch.make_fractal(args.fractal, max(2, args.depth),
+                                 not args.gray, args.smooth, False, False,
+                                 tuple(args.constant))
+    target = args.target
+    if target == None:
+        target = (fractions.Fraction(fractal.view.middle_x()),
+                  fractions.Fraction(fractal.view.middle_y()))
+    width = args.width
+    if width == None:
+        width = fractal.view.size_x()
+    directory = os.path.dirname(args.pattern)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    render(fractal, target, width, args.factor, args.frames,
+           tuple(args.size), args.pattern)
+
+if __name__ == '__main__':
+    main()